@@ -11,15 +11,22 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
 from ansible.module_utils.pycompat24 import get_exception
 
-import ast
 import traceback
 
 from ansible.module_utils.connection import *
 from ansible.module_utils.table import *
+from ansible.module_utils.retry import *
+from ansible.module_utils.explain import *
+from ansible.module_utils.inputs import *
+from ansible.module_utils.job import *
 
 # Needed to have pycharm autocompletition working
 try:
     from module_utils.connection import *
+    from module_utils.explain import *
+    from module_utils.retry import *
+    from module_utils.inputs import *
+    from module_utils.job import *
 except:
     pass
 
@@ -56,6 +63,16 @@ options:
         description:
             - Database port to connect to.
         default: 5432
+    pooler_mode:
+        description:
+            - |
+                Use C(transaction) when connecting through a pooler in transaction mode (e.g. PgBouncer with
+                pool_mode=transaction): all the work runs in explicit transactions, no session level setting is
+                changed and the timeouts are applied with SET LOCAL
+        default: session
+        choices:
+            - session
+            - transaction
     command:
         description:
             - The SQL command to execute
@@ -67,6 +84,98 @@ options:
                 or as dictionary (if named parameters are used).
                 Psycopg2 syntax is required for parameters.
                 See: http://initd.org/psycopg/docs/usage.html#passing-parameters-to-sql-queries
+    parameters_from_file:
+        description:
+            - |
+                Path of a file on the managed host containing a list of parameter sets: the command is executed once
+                for each of them, in a single transaction, sending parameter_sets_per_batch executions per round trip.
+                Supported formats, detected from the file extension, are CSV (with a header line, empty fields are
+                NULL), JSON lines (C(.jsonl)), JSON and YAML. CSV and JSON lines files are streamed.
+    parameter_sets_per_batch:
+        description:
+            - Number of parameter sets of parameters_from_file sent to the server in a single round trip
+        default: 1000
+    only_if:
+        description:
+            - |
+                Guard query executed, in the same transaction, before the command: the command is executed only if
+                the first column of the first row returned is true (e.g. C(SELECT EXISTS (...)) or a comparison)
+    unless:
+        description:
+            - |
+                Guard query executed, in the same transaction, before the command: the command is not executed if
+                the first column of the first row returned is true
+    changed_from_rowcount:
+        description:
+            - |
+                Report changed only if the command affected at least a row instead of always reporting changed.
+                With parameters_from_file the affected rows are counted executing the parameter sets one by one, with
+                a round trip for each of them, instead of in batches
+        default: false
+    explain:
+        description:
+            - |
+                Capture the execution plan of the command in JSON format.
+                With C(plan) the command is only planned (EXPLAIN), with C(analyze) it is executed with
+                EXPLAIN (ANALYZE, BUFFERS) and its effects are always rolled back.
+        default: ""
+        choices:
+            - plan
+            - analyze
+    explain_only:
+        description:
+            - Return only the plan, without executing (and committing) the command
+        default: false
+    explain_top:
+        description:
+            - Number of plan nodes returned in the plan summary, ordered by time (or cost) and by buffers
+        default: 5
+    statement_timeout:
+        description:
+            - |
+                Value of the statement_timeout setting applied to the session (e.g. C(30s), C(5min) or milliseconds).
+                Statements running longer are aborted by the server.
+    lock_timeout:
+        description:
+            - Value of the lock_timeout setting applied to the session
+    idle_in_transaction_session_timeout:
+        description:
+            - Value of the idle_in_transaction_session_timeout setting applied to the session (PostgreSQL >= 9.6)
+    deadline:
+        description:
+            - |
+                Maximum execution time of the module in seconds, 0 means no limit.
+                When the deadline expires, or when the module is interrupted (e.g. by SIGTERM), the running command
+                is cancelled on the server with pg_cancel_backend() issued from a side connection.
+        default: 0
+    max_attempts:
+        description:
+            - |
+                Maximum number of times the command transaction is attempted when it fails with one of
+                the retry_sqlstates errors (serialization failures, deadlocks, lock timeouts)
+        default: 3
+    retry_backoff:
+        description:
+            - |
+                Base delay in seconds between attempts. The delay doubles at each attempt and a random jitter is
+                applied to it.
+        default: 0.1
+    retry_sqlstates:
+        description:
+            - List of SQLSTATE codes that cause the transaction to be replayed
+        default: ["40001", "40P01", "55P03"]
+    detach:
+        description:
+            - |
+                Execute the command in a background process, on its own autocommit connection, and return as soon as
+                it was sent to the server. The returned job_id can be given to the postgresql_job module to follow
+                the progress of the command or to cancel it. The command is not lost if the module connection drops.
+                Guards, explain, retries and parameters_from_file are not available with detach.
+        default: false
+    job_dir:
+        description:
+            - Directory of the managed host storing the state files of the detached commands
+        default: ~/.ansible_pgsql_jobs
 
 extends_documentation_fragment:
     - Postgresql
@@ -97,16 +206,101 @@ EXAMPLES = '''
     command: "UPDATE my_table SET status = FALSE AND id < %(id)s"
         id: 10
   register: command_results
+
+# Check the plan of a bulk update before running it: the update is executed and rolled back
+- postgresql_command:
+    database: my_app
+    command: "UPDATE my_table SET status = FALSE WHERE id < %(id)s"
+    parameters:
+        id: 10
+    explain: analyze
+    explain_only: true
+  register: update_plan
+  failed_when: "update_plan.plan_summary.execution_time > 1000"
+
+# Insert the rows listed in a CSV file (with id and status columns) of the managed host
+- postgresql_command:
+    database: my_app
+    command: "INSERT INTO my_table (id, status) VALUES (%(id)s, %(status)s)"
+    parameters_from_file: /tmp/my_table.csv
+
+# Backfill the status column only when there are rows still to be updated
+- postgresql_command:
+    database: my_app
+    command: "UPDATE my_table SET status = FALSE WHERE status IS NULL"
+    only_if: "SELECT EXISTS (SELECT 1 FROM my_table WHERE status IS NULL)"
+    changed_from_rowcount: true
+
+# Build an index in background and wait for its completion
+- postgresql_command:
+    database: my_app
+    command: "CREATE INDEX CONCURRENTLY my_table_status_idx ON my_table (status)"
+    detach: true
+  register: index_job
+
+- postgresql_job:
+    job_id: "{{ index_job.job_id }}"
+  register: index_status
+  until: index_status.finished
+  retries: 360
+  delay: 10
+
+# Never wait for locks more than 5 seconds and cancel the command on the server if it runs for more than 10 minutes
+- postgresql_command:
+    database: my_app
+    command: "UPDATE my_table SET status = FALSE"
+    lock_timeout: 5s
+    deadline: 600
+  async: 900
+  poll: 10
 '''
 
 RETURN = '''
 executed_command:
     description: the body of the SQL command sent to the backend (including bound arguments) as bytes string
 rowCount:
-    description: number of rows affected by the command
+    description: |
+        number of rows affected by the command, -1 when parameters_from_file is used without changed_from_rowcount
+records:
+    description: number of parameter sets executed, returned when parameters_from_file is used
+plan:
+    description: JSON execution plan of the command, returned when explain is set
+plan_summary:
+    description: |
+        summary of the plan returned when explain is set: total cost, planning and execution time and the top nodes
+        by exclusive time (or cost if the command was not analyzed) and by shared buffers accessed
+attempts:
+    description: number of times the transaction was attempted
+lsn:
+    description: |
+        WAL location after the commit, to be used with postgresql_wait_replay to read the changes on standbys.
+        Not returned when the command was skipped by a guard query.
+skipped_by:
+    description: name of the guard query (only_if or unless) that prevented the execution of the command
+job_id:
+    description: identifier of the detached command, returned when detach is set
+state_file:
+    description: path of the file storing the state of the detached command, returned when detach is set
+backend_pid:
+    description: pid of the backend executing the detached command, returned when detach is set
 '''
 
 
+def _guard_result(cursor, query):
+    cursor.execute(query)
+    row = cursor.fetchone() if cursor.description else None
+    return row is not None and bool(row[cursor.description[0][0]])
+
+
+def _guard(cursor, only_if, unless):
+    """Name of the guard query preventing the execution of the command, None if the command must be executed"""
+    if only_if and not _guard_result(cursor, only_if):
+        return "only_if"
+    if unless and _guard_result(cursor, unless):
+        return "unless"
+    return None
+
+
 def run_module():
     module_args = dict(
         login_user=dict(default="postgres"),
@@ -115,34 +309,136 @@ def run_module():
         login_unix_socket=dict(default=""),
         database=dict(default="postgres"),
         port=dict(default="5432"),
+        pooler_mode=dict(default="session", choices=["session", "transaction"]),
         command=dict(required=True),
-        parameters=dict(default=[])
+        parameters=dict(type='raw', default=[]),
+        parameters_from_file=dict(default=""),
+        parameter_sets_per_batch=dict(type='int', default=1000),
+        only_if=dict(default=""),
+        unless=dict(default=""),
+        changed_from_rowcount=dict(type='bool', default=False),
+        explain=dict(default="", choices=["", "plan", "analyze"]),
+        explain_only=dict(type='bool', default=False),
+        explain_top=dict(type='int', default=5),
+        statement_timeout=dict(default=""),
+        lock_timeout=dict(default=""),
+        idle_in_transaction_session_timeout=dict(default=""),
+        deadline=dict(type='int', default=0),
+        max_attempts=dict(type='int', default=3),
+        retry_backoff=dict(type='float', default=0.1),
+        retry_sqlstates=dict(type='list', default=RETRYABLE_SQLSTATES),
+        detach=dict(type='bool', default=False),
+        job_dir=dict(default=DEFAULT_JOB_DIR)
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[["parameters", "parameters_from_file"]],
         supports_check_mode=False
     )
 
     database = module.params["database"]
-    parameters = ast.literal_eval(module.params["parameters"])
+    parameters_file = module.params["parameters_from_file"]
+    explain_mode = module.params["explain"]
+    only_if = module.params["only_if"]
+    unless = module.params["unless"]
 
     if not postgresqldb_found:
         module.fail_json(msg="the python psycopg2 module is required")
 
+    if parameters_file and explain_mode:
+        module.fail_json(msg="explain can't be used with parameters_from_file")
+
+    try:
+        parameters = structured_param(module.params["parameters"])
+    except ValueError:
+        e = get_exception()
+        module.fail_json(msg="parameters error: %s" % to_native(e))
+
+    if module.params["detach"]:
+        if parameters_file or explain_mode or only_if or unless:
+            module.fail_json(msg="detach can't be used with parameters_from_file, explain, only_if or unless")
+        try:
+            job = start_job(
+                module.params["job_dir"],
+                database,
+                prepare_connection_params(module.params),
+                module.params["command"],
+                parameters
+            )
+        except (IOError, OSError):
+            e = get_exception()
+            module.fail_json(msg="detach error: %s" % to_native(e))
+        module.exit_json(
+            changed=True,
+            job_id=job['job_id'],
+            state_file=job['state_file'],
+            backend_pid=job['backend_pid']
+        )
+
     cursor = None
     try:
-        cursor = connect(database, prepare_connection_params(module.params))
+        cursor = connect(database, prepare_connection_params(module.params), deadline=module.params["deadline"])
         cursor.connection.autocommit = False
-        cursor.execute(module.params["command"], parameters)
 
-        cursor.connection.commit()
+        result = dict(changed=True)
+        if explain_mode:
+            plan = explain(cursor, module.params["command"], parameters, explain_mode)
+            # EXPLAIN ANALYZE executes the command: its effects must never be kept
+            cursor.connection.rollback()
+            result['plan'] = plan
+            result['plan_summary'] = summarize_plan(plan, module.params["explain_top"])
+            if module.params["explain_only"]:
+                result['changed'] = False
+                disarm_deadline()
+                module.exit_json(**result)
 
-        module.exit_json(
-            changed=True,
-            executed_command=cursor.query,
-            rowCount=cursor.rowcount
+        def skip(cursor, guard):
+            cursor.connection.rollback()
+            return dict(changed=False, skipped_by=guard, rowCount=0)
+
+        def execute(cursor):
+            guard = _guard(cursor, only_if, unless)
+            if guard is not None:
+                return skip(cursor, guard)
+            cursor.execute(module.params["command"], parameters)
+            cursor.connection.commit()
+            return dict(executed_command=cursor.query, rowCount=cursor.rowcount)
+
+        def execute_batches(cursor):
+            guard = _guard(cursor, only_if, unless)
+            if guard is not None:
+                return skip(cursor, guard)
+            records = 0
+            row_count = 0 if module.params["changed_from_rowcount"] else -1
+            # The file is read again on each attempt so that a replayed transaction executes all the parameter sets
+            for chunk in chunks(iter_file_records(parameters_file), module.params["parameter_sets_per_batch"]):
+                if row_count >= 0:
+                    # execute_batch() joins the statements of a page: only the rows of the last one are reported
+                    cursor.executemany(module.params["command"], chunk)
+                    row_count += cursor.rowcount
+                else:
+                    psycopg2.extras.execute_batch(cursor, module.params["command"], chunk, page_size=len(chunk))
+                records += len(chunk)
+            cursor.connection.commit()
+            return dict(executed_command=module.params["command"], rowCount=row_count, records=records)
+
+        executed, attempts = run_with_retry(
+            cursor,
+            execute_batches if parameters_file else execute,
+            module.params["max_attempts"],
+            module.params["retry_backoff"],
+            # YAML gives unquoted codes like 40001 as integers
+            [str(s) for s in module.params["retry_sqlstates"]]
         )
+        result.update(executed)
+        if 'skipped_by' not in executed:
+            if module.params["changed_from_rowcount"]:
+                result['changed'] = executed['rowCount'] > 0
+            result['lsn'] = current_wal_lsn(cursor)
+
+        disarm_deadline()
+        module.exit_json(attempts=attempts, **result)
 
     except psycopg2.ProgrammingError:
         e = get_exception()
@@ -150,10 +446,16 @@ def run_module():
     except psycopg2.DatabaseError:
         e = get_exception()
         module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
-    except TypeError:
+    except (TypeError, IOError, ValueError):
         e = get_exception()
         module.fail_json(msg="parameters error: %s" % to_native(e))
+    except KeyboardInterrupt:
+        # Raised by the signal handlers installed by connect() outside of a wait for the server,
+        # e.g. during the backoff between two attempts
+        disarm_deadline()
+        module.fail_json(msg="deadline expired or module interrupted")
     finally:
+        disarm_deadline()
         if cursor:
             cursor.connection.rollback()
 
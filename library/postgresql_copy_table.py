@@ -0,0 +1,359 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+    from psycopg2 import sql
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+from ansible.module_utils.six import integer_types, reraise, string_types
+
+import sys
+import threading
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.table import *
+from ansible.module_utils.parallel import *
+from ansible.module_utils.stream import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.table import *
+    from module_utils.parallel import *
+    from module_utils.stream import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_copy_table
+
+short_description: copy the data of a PostGreSQL table to another database
+
+version_added: "2.4"
+
+description:
+    - "Copy the rows of a table to a table of another database, piping COPY TO STDOUT on the source connection into
+       COPY FROM STDIN on the target connection through a bounded in-memory buffer, without temporary files"
+    - "With parallel workers the source table is split in ranges of its primary key. All the workers read the source
+       table from the same snapshot, exported by a coordinating connection"
+    - "Each range is committed separately on the target database: after a failure the target table can be
+       partially loaded and the ranges already committed are returned"
+
+options:
+    database:
+        description:
+            - Name of the source database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the source database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    schema:
+        description:
+            - Schema of the source table
+        default: public
+    table:
+        description:
+            - Name of the source table
+        required: true
+    target_dsn:
+        description:
+            - |
+                libpq connection string of the target database,
+                e.g. C(host=new-cluster dbname=my_app user=postgres)
+        required: true
+    target_schema:
+        description:
+            - Schema of the target table, defaults to schema
+    target_table:
+        description:
+            - Name of the target table, defaults to table
+    create:
+        description:
+            - |
+                Create the target table, if it does not exist, with the columns (name, type and not null constraint)
+                and the primary key of the source table
+        default: false
+    truncate:
+        description:
+            - |
+                Truncate the target table before copying the rows. Without parallel workers the table is truncated in
+                the transaction copying the rows, so a failed copy leaves it unchanged; with parallel workers it is
+                truncated before the copy starts.
+        default: false
+    parallel:
+        description:
+            - Number of workers copying primary key ranges concurrently. The source table must have a primary key.
+        default: 1
+    chunk_size:
+        description:
+            - Number of rows of each primary key range copied by the parallel workers
+        default: 100000
+    buffer_size:
+        description:
+            - Maximum number of bytes buffered in memory by each worker between the source and the target
+        default: 8388608
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Move the orders table to the new cluster with 4 workers
+- postgresql_copy_table:
+    database: my_app
+    table: orders
+    target_dsn: "host=new-cluster dbname=my_app user=postgres"
+    create: true
+    truncate: true
+    parallel: 4
+'''
+
+RETURN = '''
+created:
+    description: true if the target table was created
+rows:
+    description: number of rows copied
+ranges:
+    description: number of primary key ranges copied
+duration:
+    description: duration of the copy in seconds
+committed_ranges:
+    description: |
+        returned on failure, list of the primary key ranges committed on the target database. Each item is a dict with
+        the lower (excluded) and upper (included) primary key values of the range, null when unbounded, and the number
+        of rows copied
+'''
+
+
+def _create_table_query(schema, name, columns, primary_key):
+    definitions = [
+        sql.SQL("{name} %s%s" % (c['type'], '' if c['null'] else ' NOT NULL')).format(name=sql.Identifier(c['name']))
+        for c in columns
+    ]
+    if len(primary_key) > 0:
+        definitions.append(sql.SQL("PRIMARY KEY ({columns})").format(
+            columns=sql.SQL(", ").join([sql.Identifier(c) for c in primary_key])
+        ))
+    return sql.SQL("CREATE TABLE {schema}.{name} ({definitions})").format(
+        schema=sql.Identifier(schema),
+        name=sql.Identifier(name),
+        definitions=sql.SQL(", ").join(definitions)
+    )
+
+
+def _json_key(values):
+    if values is None:
+        return None
+    return [v if isinstance(v, integer_types + string_types) else to_native(v) for v in values]
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        schema=dict(default="public"),
+        table=dict(required=True),
+        target_dsn=dict(required=True, no_log=True),
+        target_schema=dict(default=""),
+        target_table=dict(default=""),
+        create=dict(type='bool', default=False),
+        truncate=dict(type='bool', default=False),
+        parallel=dict(type='int', default=1),
+        chunk_size=dict(type='int', default=100000),
+        buffer_size=dict(type='int', default=8 * 1024 * 1024)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+
+    database = module.params["database"]
+    schema = module.params["schema"]
+    table = module.params["table"]
+    target_schema = module.params["target_schema"] or schema
+    target_table = module.params["target_table"] or table
+    target_dsn = module.params["target_dsn"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    connection_params = prepare_connection_params(module.params)
+
+    cursor = None
+    committed = []
+    try:
+        start = time.time()
+        cursor = connect(database, connection_params)
+        columns = table_columns(cursor, schema, table)
+        if len(columns) == 0:
+            module.fail_json(msg="table %s.%s does not exist" % (schema, table))
+        key_columns = primary_key_columns(cursor, schema, table)
+
+        if module.params["parallel"] > 1 and len(key_columns) == 0:
+            module.fail_json(msg="table %s.%s has no primary key, parallel copy is not possible" % (schema, table))
+
+        # The workers import the snapshot exported here, so they all read the same data
+        cursor.connection.autocommit = False
+        cursor.connection.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        cursor.execute("SELECT pg_catalog.pg_export_snapshot() AS snapshot")
+        snapshot = cursor.fetchone()['snapshot']
+
+        if module.params["parallel"] > 1:
+            ranges = primary_key_ranges(cursor, schema, table, key_columns, module.params["chunk_size"])
+        else:
+            ranges = [(None, None)]
+
+        target_cursor = connect(None, {"dsn": target_dsn})
+        created = False
+        if module.params["create"] and len(table_columns(target_cursor, target_schema, target_table)) == 0:
+            target_cursor.execute(_create_table_query(target_schema, target_table, columns, key_columns))
+            created = True
+        truncate = sql.SQL("TRUNCATE {schema}.{name}").format(
+            schema=sql.Identifier(target_schema),
+            name=sql.Identifier(target_table)
+        )
+        if module.params["truncate"] and module.params["parallel"] > 1:
+            # Each range is committed by its worker: the table is emptied before all of them
+            target_cursor.execute(truncate)
+        target_cursor.connection.close()
+
+        column_list = sql.SQL(", ").join([sql.Identifier(c['name']) for c in columns])
+        copy_in = sql.SQL("COPY {schema}.{name} ({columns}) FROM STDIN").format(
+            schema=sql.Identifier(target_schema),
+            name=sql.Identifier(target_table),
+            columns=column_list
+        )
+
+        def setup():
+            source = connect(database, connection_params)
+            source.connection.autocommit = False
+            source.connection.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            source.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+            target = connect(None, {"dsn": target_dsn})
+            target.connection.autocommit = False
+            return source, target
+
+        def teardown(cursors):
+            for c in cursors:
+                c.connection.close()
+
+        def copy_range(cursors, key_range):
+            source, target = cursors
+            if module.params["truncate"] and module.params["parallel"] == 1:
+                target.execute(truncate)
+            condition, parameters = primary_key_range_condition(key_columns, key_range[0], key_range[1])
+            copy_out = source.mogrify(
+                sql.SQL("COPY (SELECT {columns} FROM {schema}.{name} WHERE {condition}) TO STDOUT").format(
+                    columns=column_list,
+                    schema=sql.Identifier(schema),
+                    name=sql.Identifier(table),
+                    condition=condition
+                ),
+                parameters
+            )
+
+            pipe = BoundedPipe(module.params["buffer_size"])
+            source_errors = []
+
+            def produce():
+                try:
+                    source.copy_expert(copy_out, pipe)
+                except Exception:
+                    source_errors.append(sys.exc_info())
+                    pipe.abort()
+                else:
+                    pipe.close()
+
+            producer = threading.Thread(target=produce)
+            producer.start()
+            try:
+                target.copy_expert(copy_in, pipe)
+            except Exception:
+                pipe.abort()
+                producer.join()
+                if source_errors:
+                    reraise(*source_errors[0])
+                raise
+            producer.join()
+            if source_errors:
+                reraise(*source_errors[0])
+
+            target.connection.commit()
+            committed.append({
+                'lower': _json_key(key_range[0]),
+                'upper': _json_key(key_range[1]),
+                'rows': target.rowcount
+            })
+            return target.rowcount
+
+        copied = parallel_map(copy_range, ranges, module.params["parallel"], setup, teardown)
+
+        module.exit_json(
+            changed=True,
+            created=created,
+            rows=sum(copied),
+            ranges=len(ranges),
+            duration=time.time() - start
+        )
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(
+            msg="database error: %s" % to_native(e),
+            committed_ranges=committed,
+            exception=traceback.format_exc()
+        )
+    except IOError:
+        e = get_exception()
+        module.fail_json(
+            msg="copy error: %s" % to_native(e),
+            committed_ranges=committed,
+            exception=traceback.format_exc()
+        )
+    finally:
+        if cursor:
+            cursor.connection.rollback()
+
+if __name__ == '__main__':
+    run_module()
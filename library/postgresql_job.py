@@ -0,0 +1,229 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import errno
+import os
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.progress import *
+from ansible.module_utils.job import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.progress import *
+    from module_utils.job import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_job
+
+short_description: report the status of a command detached by postgresql_command, or cancel it
+
+version_added: "2.4"
+
+description:
+    - "Read the state of a command started by postgresql_command with detach and, while it is running, its backend
+       activity from pg_stat_activity and its progress from the pg_stat_progress views (CREATE INDEX, CLUSTER,
+       VACUUM and ANALYZE), with an estimate of the time left to the end of the current phase"
+    - "With state cancelled the running command is cancelled with pg_cancel_backend()"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to, defaults to the database of the job.
+    login_host:
+        description:
+            - Host running the database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    job_id:
+        description:
+            - Identifier of the job returned by postgresql_command
+        required: true
+    job_dir:
+        description:
+            - Directory of the managed host storing the state files of the detached commands
+        default: ~/.ansible_pgsql_jobs
+    state:
+        description:
+            - C(status) reports the state of the job, C(cancelled) cancels it if it is running
+        default: status
+        choices:
+            - status
+            - cancelled
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+   - The module must run on the host where the job was started.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Wait for the completion of a detached index build
+- postgresql_job:
+    job_id: "{{ index_job.job_id }}"
+  register: index_status
+  until: index_status.finished
+  retries: 360
+  delay: 10
+
+# Cancel it
+- postgresql_job:
+    job_id: "{{ index_job.job_id }}"
+    state: cancelled
+'''
+
+RETURN = '''
+status:
+    description: |
+        state of the job: running, finished, failed or lost (the process executing the command ended without
+        recording its result)
+finished:
+    description: true if the job is no longer running
+rowcount:
+    description: number of rows affected by the command, returned when the job finished
+error:
+    description: error message of the command, returned when the job failed
+elapsed:
+    description: seconds since the start of the command (or duration of the command when it ended)
+activity:
+    description: state, wait_event_type and wait_event of the backend running the command
+progress:
+    description: |
+        progress of the running command, when reported by the server: command, relation, phase, done and total units
+        of work of the phase and percent done
+phase_eta:
+    description: |
+        estimated seconds to the end of the current phase, from the progress made since the phase was first observed
+        by the module; null when the phase is observed for the first time (e.g. it changed since the previous call)
+        or when no progress was made since. The phases still to come are not estimated: this is not the time left
+        to the end of the command
+'''
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        e = get_exception()
+        return e.errno == errno.EPERM
+    return True
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default=""),
+        port=dict(default="5432"),
+        job_id=dict(required=True),
+        job_dir=dict(default=DEFAULT_JOB_DIR),
+        state=dict(default="status", choices=["status", "cancelled"])
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    try:
+        job = read_job(job_state_file(module.params["job_dir"], module.params["job_id"]))
+    except (IOError, ValueError):
+        e = get_exception()
+        module.fail_json(msg="job error: %s" % to_native(e))
+
+    result = dict(changed=False, job_id=job['job_id'], status=job['status'])
+    for k in ('rowcount', 'error'):
+        if k in job:
+            result[k] = job[k]
+    if 'ended' in job:
+        result['elapsed'] = job['ended'] - job['started']
+    elif job['status'] == "running" and not _process_alive(job['pid']):
+        result['status'] = "lost"
+    result['finished'] = result['status'] != "running"
+    if result['finished']:
+        forget_phase(job['state_file'])
+        module.exit_json(**result)
+
+    result['elapsed'] = time.time() - job['started']
+    cursor = None
+    try:
+        cursor = connect(module.params["database"] or job['database'], prepare_connection_params(module.params))
+
+        if module.params["state"] == "cancelled":
+            if not module.check_mode:
+                cursor.execute("SELECT pg_catalog.pg_cancel_backend(%s)", (job['backend_pid'],))
+            module.exit_json(**dict(result, changed=True))
+
+        cursor.execute(
+            "SELECT state, wait_event_type, wait_event FROM pg_catalog.pg_stat_activity WHERE pid = %s",
+            (job['backend_pid'],)
+        )
+        result['activity'] = dict(cursor.fetchone()) if cursor.rowcount == 1 else None
+
+        progress = backend_progress(cursor, [job['backend_pid']]).get(job['backend_pid'])
+        result['progress'] = progress
+        result['phase_eta'] = None
+        if progress is not None:
+            # The elapsed time of the command covers the previous phases too: the rate is measured within the phase
+            seen = phase_first_seen(job['state_file'], progress)
+            if seen is not None and seen['percent'] is not None and progress['percent'] is not None:
+                rate = (progress['percent'] - seen['percent']) / (time.time() - seen['seen'])
+                if rate > 0:
+                    result['phase_eta'] = (100 - progress['percent']) / rate
+
+        module.exit_json(**result)
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+    finally:
+        if cursor:
+            cursor.connection.close()
+
+if __name__ == '__main__':
+    run_module()
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+    from psycopg2 import sql
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.parallel import *
+from ansible.module_utils.progress import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.parallel import *
+    from module_utils.progress import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_maintenance
+
+short_description: run VACUUM, ANALYZE or REINDEX on the tables of a PostGreSQL database
+
+version_added: "2.4"
+
+description:
+    - "Select the tables of a database by name pattern and dead tuples thresholds and run VACUUM, VACUUM ANALYZE,
+       ANALYZE or REINDEX CONCURRENTLY on them with a bounded pool of autocommit connections, the largest tables
+       first"
+    - "The progress of each command is sampled from the pg_stat_progress views and the last sample is reported with
+       the duration of each table"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    action:
+        description:
+            - Maintenance command run on each table
+        default: vacuum_analyze
+        choices:
+            - vacuum
+            - vacuum_analyze
+            - analyze
+            - reindex
+    schema_pattern:
+        description:
+            - Regular expression matching the schemas of the tables
+        default: ^public$
+    table_pattern:
+        description:
+            - Regular expression matching the names of the tables
+        default: .*
+    min_dead_tuples:
+        description:
+            - Minimum number of dead tuples (n_dead_tup of pg_stat_user_tables) of the selected tables
+        default: 0
+    min_dead_ratio:
+        description:
+            - Minimum ratio, between 0 and 1, of dead tuples over all the tuples of the selected tables
+        default: 0
+    parallel:
+        description:
+            - Number of connections running the commands concurrently
+        default: 2
+    cost_delay:
+        description:
+            - Value of vacuum_cost_delay (in milliseconds) set on the connections, throttling the I/O of the commands
+    cost_limit:
+        description:
+            - Value of vacuum_cost_limit set on the connections
+    progress_interval:
+        description:
+            - Seconds between two samples of the progress of the running commands
+        default: 1
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+   - REINDEX CONCURRENTLY requires PostgreSQL 12 or later.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Vacuum and analyze the tables with more than 10% of dead tuples after a migration
+- postgresql_maintenance:
+    database: my_app
+    action: vacuum_analyze
+    min_dead_ratio: 0.1
+    parallel: 4
+    cost_delay: 2
+  register: maintenance
+
+# Rebuild the indexes of the orders tables without blocking writes
+- postgresql_maintenance:
+    database: my_app
+    action: reindex
+    table_pattern: ^orders
+'''
+
+RETURN = '''
+tables:
+    description: |
+        list of the processed tables (in check mode, of the tables that would be processed). Each item is a dict with
+        schema, table, n_live_tup, n_dead_tup, duration in seconds and progress, the last sample of the command
+        progress (command, phase, done, total and percent) or null when none was taken
+duration:
+    description: total duration in seconds
+'''
+
+_COMMANDS = {
+    "vacuum": "VACUUM {table}",
+    "vacuum_analyze": "VACUUM (ANALYZE) {table}",
+    "analyze": "ANALYZE {table}",
+    "reindex": "REINDEX TABLE CONCURRENTLY {table}",
+}
+
+
+def _targets(cursor, params):
+    cursor.execute(
+        """
+        SELECT schemaname AS schema, relname AS table, n_live_tup, n_dead_tup
+        FROM pg_catalog.pg_stat_user_tables
+        WHERE schemaname ~ %(schema_pattern)s AND relname ~ %(table_pattern)s
+          AND n_dead_tup >= %(min_dead_tuples)s AND n_dead_tup >= %(min_dead_ratio)s * (n_live_tup + n_dead_tup)
+        ORDER BY pg_catalog.pg_total_relation_size(relid) DESC, schemaname, relname
+        """,
+        params
+    )
+    return [dict(r) for r in cursor.fetchall()]
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        action=dict(default="vacuum_analyze", choices=["vacuum", "vacuum_analyze", "analyze", "reindex"]),
+        schema_pattern=dict(default="^public$"),
+        table_pattern=dict(default=".*"),
+        min_dead_tuples=dict(type='int', default=0),
+        min_dead_ratio=dict(type='float', default=0),
+        parallel=dict(type='int', default=2),
+        cost_delay=dict(type='int'),
+        cost_limit=dict(type='int'),
+        progress_interval=dict(type='float', default=1)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    action = module.params["action"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    connection_params = prepare_connection_params(module.params)
+
+    cursor = None
+    monitor = None
+    try:
+        start = time.time()
+        cursor = connect(database, connection_params)
+        if action == "reindex" and cursor.connection.server_version < 120000:
+            module.fail_json(msg="REINDEX CONCURRENTLY requires PostgreSQL 12 or later")
+
+        targets = _targets(cursor, module.params)
+        if module.check_mode or len(targets) == 0:
+            module.exit_json(changed=len(targets) > 0, tables=targets, duration=time.time() - start)
+
+        settings = {}
+        if module.params["cost_delay"] is not None:
+            settings["vacuum_cost_delay"] = module.params["cost_delay"]
+        if module.params["cost_limit"] is not None:
+            settings["vacuum_cost_limit"] = module.params["cost_limit"]
+
+        def setup():
+            worker = connect(database, connection_params)
+            for k, v in settings.items():
+                worker.execute(sql.SQL("SET {name} = %s").format(name=sql.Identifier(k)), (v,))
+            return worker
+
+        def teardown(worker):
+            worker.connection.close()
+
+        def maintain(worker, target):
+            pid = worker.connection.get_backend_pid()
+            monitor.pop(pid)
+            target_start = time.time()
+            worker.execute(sql.SQL(_COMMANDS[action]).format(
+                table=sql.SQL("{schema}.{name}").format(
+                    schema=sql.Identifier(target['schema']),
+                    name=sql.Identifier(target['table'])
+                )
+            ))
+            target['duration'] = time.time() - target_start
+            target['progress'] = monitor.pop(pid)
+            return target
+
+        monitor = ProgressMonitor(cursor, module.params["progress_interval"])
+        monitor.start()
+        tables = parallel_map(maintain, targets, module.params["parallel"], setup, teardown)
+
+        module.exit_json(changed=True, tables=tables, duration=time.time() - start)
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+    finally:
+        if monitor:
+            monitor.stop()
+        if cursor:
+            cursor.connection.close()
+
+if __name__ == '__main__':
+    run_module()
@@ -0,0 +1,386 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+    from psycopg2 import sql
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import hashlib
+import json
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_matview
+
+short_description: manage and refresh a materialized view in a PostGreSQL database
+
+version_added: "2.4"
+
+description:
+    - "Ensure that a materialized view is present with the given definition (or absent) and refresh it"
+    - "An existing materialized view whose query is the same as the given one, as returned by pg_get_viewdef(), is
+       kept as it is, with its indexes, grants, dependent views and comment"
+    - "The refresh is skipped when the tables the view reads from were not modified since the last refresh, comparing
+       the pg_stat_all_tables modification counters and relfilenodes stored in the view comment at the last refresh"
+    - "When a valid unique index exists the view is refreshed CONCURRENTLY, without locking out readers"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    pooler_mode:
+        description:
+            - |
+                Use C(transaction) when connecting through a pooler in transaction mode (e.g. PgBouncer with
+                pool_mode=transaction): all the work runs in explicit transactions, no session level setting is
+                changed and the timeouts are applied with SET LOCAL
+        default: session
+        choices:
+            - session
+            - transaction
+    name:
+        description:
+            - Name of the materialized view
+        required: true
+    schema:
+        description:
+            - Schema of the materialized view
+        default: public
+    state:
+        description:
+            - The materialized view state
+        default: present
+        choices:
+            - present
+            - absent
+    query:
+        description:
+            - |
+                Query defining the materialized view, required when state is present.
+                When the query changes the view is dropped and created again, losing its indexes: use unique_index
+                to have the unique index needed by concurrent refreshes created again.
+    unique_index:
+        description:
+            - List of columns of a unique index to create on the view if missing
+    refresh:
+        description:
+            - |
+                C(auto) refreshes the view only if the tables it reads from were modified since the last refresh,
+                C(always) refreshes it at each run and C(never) does not refresh it
+        default: auto
+        choices:
+            - auto
+            - always
+            - never
+    concurrently:
+        description:
+            - Use REFRESH MATERIALIZED VIEW CONCURRENTLY when the view is populated and has a valid unique index
+        default: true
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+   - The module stores the state of the last refresh in the comment of the materialized view, unless the view has a
+     comment set by other means: that comment is kept and, with refresh auto, the view is refreshed at each run.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Create the daily_sales view and refresh it when the orders table changes
+- postgresql_matview:
+    database: my_app
+    name: daily_sales
+    query: "SELECT day, sum(amount) AS amount FROM orders GROUP BY day"
+    unique_index:
+      - day
+  register: daily_sales
+
+# Drop the daily_sales view
+- postgresql_matview:
+    database: my_app
+    name: daily_sales
+    state: absent
+'''
+
+RETURN = '''
+created:
+    description: true if the materialized view was created (or created again because its query changed)
+refreshed:
+    description: true if the materialized view was refreshed
+concurrently:
+    description: true if the refresh was done CONCURRENTLY
+refresh_duration:
+    description: duration of the refresh (or of the creation) in seconds
+'''
+
+_COMMENT_PREFIX = "ansible_pgsql:"
+
+
+def _matview(cursor, schema, name):
+    cursor.execute(
+        """
+        SELECT c.oid, c.relispopulated, pg_catalog.obj_description(c.oid, 'pg_class') AS comment,
+          EXISTS (
+            SELECT 1 FROM pg_catalog.pg_index i
+            WHERE i.indrelid = c.oid AND i.indisunique AND i.indisvalid AND i.indpred IS NULL
+              AND i.indexprs IS NULL
+          ) AS has_unique_index
+        FROM pg_catalog.pg_class c
+             JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND c.relkind = 'm';
+        """,
+        (schema, name)
+    )
+    if cursor.rowcount != 1:
+        return None
+    return cursor.fetchone()
+
+
+def _same_query(cursor, matview_oid, query):
+    # pg_get_viewdef() returns the query as deparsed by the server: the given query is deparsed in the same way through
+    # a temporary view, discarded with the savepoint
+    cursor.execute("SAVEPOINT ansible_pgsql_matview")
+    try:
+        cursor.execute(
+            sql.SQL("CREATE TEMPORARY VIEW ansible_pgsql_matview_query AS {query}").format(query=sql.SQL(query))
+        )
+        cursor.execute(
+            """
+            SELECT pg_catalog.pg_get_viewdef(%s::oid) =
+              pg_catalog.pg_get_viewdef('pg_temp.ansible_pgsql_matview_query'::regclass) AS same
+            """,
+            (matview_oid,)
+        )
+        return cursor.fetchone()['same']
+    finally:
+        cursor.execute("ROLLBACK TO SAVEPOINT ansible_pgsql_matview")
+
+
+def _sources_state(cursor, matview_oid):
+    # Tables read by the view, following the views it reads from, and their partitions (or inheritance children):
+    # the statistics of partitioned tables are kept on their partitions only.
+    # TRUNCATE and table rewrites are not counted by pg_stat_all_tables but change the relfilenode.
+    cursor.execute(
+        """
+        WITH RECURSIVE sources(relid) AS (
+            SELECT d.refobjid
+            FROM pg_catalog.pg_rewrite r
+                 JOIN pg_catalog.pg_depend d ON d.objid = r.oid
+            WHERE r.ev_class = %(oid)s AND d.classid = 'pg_catalog.pg_rewrite'::regclass
+              AND d.refclassid = 'pg_catalog.pg_class'::regclass AND d.refobjid <> %(oid)s
+          UNION
+            SELECT d.refobjid
+            FROM sources s
+                 JOIN pg_catalog.pg_rewrite r ON r.ev_class = s.relid
+                 JOIN pg_catalog.pg_depend d ON d.objid = r.oid
+            WHERE d.classid = 'pg_catalog.pg_rewrite'::regclass AND d.refclassid = 'pg_catalog.pg_class'::regclass
+              AND d.refobjid <> s.relid
+        ), tables(relid) AS (
+            SELECT relid FROM sources
+          UNION
+            SELECT i.inhrelid
+            FROM tables t
+                 JOIN pg_catalog.pg_inherits i ON i.inhparent = t.relid
+        )
+        SELECT count(*) AS tables,
+          coalesce(sum(t.n_tup_ins + t.n_tup_upd + t.n_tup_del), 0)::text || ':' ||
+            coalesce(string_agg(pg_catalog.pg_relation_filenode(t.relid)::text, ',' ORDER BY t.relid), '') AS state
+        FROM pg_catalog.pg_stat_all_tables t
+        WHERE t.relid IN (SELECT relid FROM tables);
+        """,
+        {'oid': matview_oid}
+    )
+    r = cursor.fetchone()
+    return r['state'] if r['tables'] > 0 else None
+
+
+def _stored_state(comment):
+    if comment is None or not comment.startswith(_COMMENT_PREFIX):
+        return {}
+    try:
+        return json.loads(comment[len(_COMMENT_PREFIX):])
+    except ValueError:
+        return {}
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        pooler_mode=dict(default="session", choices=["session", "transaction"]),
+        name=dict(required=True),
+        schema=dict(default="public"),
+        state=dict(default="present", choices=["absent", "present"]),
+        query=dict(default=""),
+        unique_index=dict(type='list', default=[]),
+        refresh=dict(default="auto", choices=["auto", "always", "never"]),
+        concurrently=dict(type='bool', default=True)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        required_if=[["state", "present", ["query"]]],
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    name = module.params["name"]
+    schema = module.params["schema"]
+    query = module.params["query"].strip().rstrip(";")
+    unique_index = module.params["unique_index"]
+    refresh = module.params["refresh"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    identifiers = dict(schema=sql.Identifier(schema), name=sql.Identifier(name))
+    definition = hashlib.md5(query.encode('utf-8')).hexdigest()
+
+    cursor = None
+    try:
+        cursor = connect(database, prepare_connection_params(module.params))
+        cursor.connection.autocommit = False
+        matview = _matview(cursor, schema, name)
+
+        if module.params["state"] == "absent":
+            if matview is not None and not module.check_mode:
+                cursor.execute(sql.SQL("DROP MATERIALIZED VIEW {schema}.{name}").format(**identifiers))
+                cursor.connection.commit()
+            module.exit_json(changed=matview is not None)
+
+        comment = matview['comment'] if matview is not None else None
+        owns_comment = comment is None or comment.startswith(_COMMENT_PREFIX)
+        stored = _stored_state(comment)
+        # Views created by other means (or by another query text) are kept when the query is the same
+        create = matview is None or (
+            stored.get('definition') != definition and not _same_query(cursor, matview['oid'], query)
+        )
+        sources_state = None
+        if not create:
+            sources_state = _sources_state(cursor, matview['oid'])
+        do_refresh = not create and (
+            refresh == "always" or
+            (refresh == "auto" and (sources_state is None or sources_state != stored.get('sources')))
+        )
+
+        if module.check_mode:
+            module.exit_json(changed=create or do_refresh, created=create, refreshed=do_refresh)
+
+        changed = False
+        concurrently = False
+        start = time.time()
+        if create:
+            if matview is not None:
+                cursor.execute(sql.SQL("DROP MATERIALIZED VIEW {schema}.{name}").format(**identifiers))
+            cursor.execute(
+                sql.SQL("CREATE MATERIALIZED VIEW {schema}.{name} AS {query}").format(
+                    query=sql.SQL(query),
+                    **identifiers
+                )
+            )
+            matview = _matview(cursor, schema, name)
+            sources_state = _sources_state(cursor, matview['oid'])
+            changed = True
+        elif do_refresh:
+            concurrently = module.params["concurrently"] and matview['relispopulated'] and matview['has_unique_index']
+            cursor.execute(
+                sql.SQL("REFRESH MATERIALIZED VIEW " + ("CONCURRENTLY " if concurrently else "") + "{schema}.{name}")
+                .format(**identifiers)
+            )
+            changed = True
+        duration = time.time() - start
+
+        if len(unique_index) > 0:
+            index_name = "%s_%s_key" % (name, "_".join(unique_index))
+            cursor.execute(
+                "SELECT 1 FROM pg_catalog.pg_indexes WHERE schemaname = %s AND indexname = %s",
+                (schema, index_name)
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(sql.SQL("CREATE UNIQUE INDEX {index} ON {schema}.{name} ({columns})").format(
+                    index=sql.Identifier(index_name),
+                    columns=sql.SQL(", ").join([sql.Identifier(c) for c in unique_index]),
+                    **identifiers
+                ))
+                changed = True
+
+        if changed and owns_comment:
+            cursor.execute(
+                sql.SQL("COMMENT ON MATERIALIZED VIEW {schema}.{name} IS %s").format(**identifiers),
+                (_COMMENT_PREFIX + json.dumps({'definition': definition, 'sources': sources_state}),)
+            )
+        elif create and comment is not None:
+            # The comment of the dropped view is not the module one: keep it
+            cursor.execute(
+                sql.SQL("COMMENT ON MATERIALIZED VIEW {schema}.{name} IS %s").format(**identifiers),
+                (comment,)
+            )
+        cursor.connection.commit()
+
+        module.exit_json(
+            changed=changed,
+            created=create,
+            refreshed=create or do_refresh,
+            concurrently=concurrently,
+            refresh_duration=duration
+        )
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+    finally:
+        if cursor:
+            cursor.connection.rollback()
+
+if __name__ == '__main__':
+    run_module()
@@ -0,0 +1,386 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import json
+import os
+import traceback
+
+from ansible.module_utils.connection import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_perf_facts
+
+short_description: gather performance facts from a PostGreSQL database
+
+version_added: "2.4"
+
+description:
+    - "Gather a compact performance health snapshot of a database: cache hit ratios, table and index bloat estimates,
+       top pg_stat_statements entries, long running transactions, replication lag and autovacuum lag"
+    - "All the facts are collected with a single query (plus one to detect pg_stat_statements)"
+    - "When a snapshot file is given, the cumulative counters are compared with the previous snapshot stored in it
+       to return rates per second"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    pooler_mode:
+        description:
+            - |
+                Use C(transaction) when connecting through a pooler in transaction mode (e.g. PgBouncer with
+                pool_mode=transaction): all the work runs in explicit transactions, no session level setting is
+                changed and the timeouts are applied with SET LOCAL
+        default: session
+        choices:
+            - session
+            - transaction
+    gather_subset:
+        description:
+            - Subsets of facts to gather
+        default: [all]
+        choices:
+            - all
+            - cache
+            - bloat
+            - statements
+            - transactions
+            - replication
+            - autovacuum
+    top:
+        description:
+            - Maximum number of items returned in each list of facts
+        default: 10
+    long_transaction_threshold:
+        description:
+            - Age in seconds after which a transaction is reported as long running
+        default: 300
+    snapshot_file:
+        description:
+            - |
+                Path of a file on the managed host storing the counters of the previous run.
+                When it exists the rates since the previous run are returned, then it is replaced with the current
+                counters.
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+   - PostgreSQL 9.4 or later is required.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Gather cache and statements facts with rates since the previous run
+- postgresql_perf_facts:
+    database: my_app
+    gather_subset:
+      - cache
+      - statements
+    top: 5
+    snapshot_file: /var/tmp/my_app_perf.json
+
+- debug:
+    var: postgresql_perf.rates.cache_hit_ratio
+'''
+
+RETURN = '''
+ansible_facts:
+    description: |
+        dict with the postgresql_perf key containing the gathered facts: collected_at (server epoch), database
+        (pg_stat_database counters and cache hit ratio) and the requested subsets. When snapshot_file is used it
+        contains also rates, with the interval in seconds, the database counters per second and the calls and time
+        per second of the top statements
+'''
+
+SUBSETS = ["cache", "bloat", "statements", "transactions", "replication", "autovacuum"]
+
+_DATABASE_COUNTERS = [
+    "xact_commit", "xact_rollback", "blks_read", "blks_hit", "tup_returned", "tup_fetched", "tup_inserted",
+    "tup_updated", "tup_deleted", "temp_files", "temp_bytes", "deadlocks"
+]
+
+_BLOCK_SIZE = "current_setting('block_size')::numeric"
+
+
+def _json_list(query):
+    return "(SELECT coalesce(json_agg(f), '[]') FROM (%s) f)" % query
+
+
+def _subset_queries(server_version, statements_available):
+    queries = {
+        "database": """
+            (SELECT row_to_json(f) FROM (
+              SELECT numbackends, %s,
+                round(blks_hit * 100.0 / nullif(blks_hit + blks_read, 0), 2) AS cache_hit_ratio
+              FROM pg_catalog.pg_stat_database WHERE datname = current_database()
+            ) f)
+            """ % ", ".join(_DATABASE_COUNTERS),
+        "cache": """
+            (SELECT row_to_json(f) FROM (
+              SELECT
+                (SELECT round(sum(heap_blks_hit) * 100.0 / nullif(sum(heap_blks_hit + heap_blks_read), 0), 2)
+                 FROM pg_catalog.pg_statio_user_tables) AS table_hit_ratio,
+                (SELECT round(sum(idx_blks_hit) * 100.0 / nullif(sum(idx_blks_hit + idx_blks_read), 0), 2)
+                 FROM pg_catalog.pg_statio_user_indexes) AS index_hit_ratio
+            ) f)
+            """,
+        "bloat": """
+            json_build_object(
+              'tables', %s,
+              'indexes', %s
+            )
+            """ % (
+            # Expected size: tuples * (tuple header + line pointer + average width) in pages with 24 bytes header
+            _json_list("""
+                SELECT schemaname, relname, size_bytes, greatest(size_bytes - expected_bytes, 0) AS bloat_bytes
+                FROM (
+                  SELECT s.schemaname, s.relname, pg_catalog.pg_relation_size(s.relid) AS size_bytes,
+                    ceil(c.reltuples * (28 + w.width) / (%(bs)s - 24)) * %(bs)s AS expected_bytes
+                  FROM pg_catalog.pg_stat_user_tables s
+                       JOIN pg_catalog.pg_class c ON c.oid = s.relid
+                       JOIN (
+                         SELECT schemaname, tablename, sum(avg_width) AS width
+                         FROM pg_catalog.pg_stats GROUP BY schemaname, tablename
+                       ) w ON w.schemaname = s.schemaname AND w.tablename = s.relname
+                ) t
+                ORDER BY bloat_bytes DESC LIMIT %%(top)s
+                """ % {'bs': _BLOCK_SIZE}),
+            # B-tree indexes: tuples * (index tuple header + line pointer + width) in 90% filled pages
+            _json_list("""
+                SELECT schemaname, relname, indexrelname, size_bytes,
+                  greatest(size_bytes - expected_bytes, 0) AS bloat_bytes
+                FROM (
+                  SELECT s.schemaname, s.relname, s.indexrelname,
+                    pg_catalog.pg_relation_size(s.indexrelid) AS size_bytes,
+                    ceil(ci.reltuples * (12 + (
+                      SELECT sum(st.avg_width)
+                      FROM pg_catalog.pg_attribute a
+                           JOIN pg_catalog.pg_stats st ON st.schemaname = s.schemaname AND st.tablename = s.relname
+                             AND st.attname = a.attname
+                      WHERE a.attrelid = s.relid AND a.attnum = ANY(i.indkey)
+                    )) / ((%(bs)s - 40) * 0.9)) * %(bs)s AS expected_bytes
+                  FROM pg_catalog.pg_stat_user_indexes s
+                       JOIN pg_catalog.pg_index i ON i.indexrelid = s.indexrelid
+                       JOIN pg_catalog.pg_class ci ON ci.oid = s.indexrelid
+                       JOIN pg_catalog.pg_am am ON am.oid = ci.relam AND am.amname = 'btree'
+                ) t
+                WHERE expected_bytes IS NOT NULL
+                ORDER BY bloat_bytes DESC LIMIT %%(top)s
+                """ % {'bs': _BLOCK_SIZE})
+        ),
+        "transactions": _json_list("""
+            SELECT pid, usename, application_name, state, wait_event_type, wait_event,
+              extract(epoch FROM now() - xact_start)::bigint AS age, left(query, 200) AS query
+            FROM pg_catalog.pg_stat_activity
+            WHERE xact_start < now() - %(long_transaction_threshold)s * interval '1 second'
+              AND pid <> pg_catalog.pg_backend_pid()
+            ORDER BY xact_start LIMIT %(top)s
+            """),
+        "replication": """
+            json_build_object(
+              'in_recovery', pg_catalog.pg_is_in_recovery(),
+              'replay_delay', CASE WHEN pg_catalog.pg_is_in_recovery()
+                THEN extract(epoch FROM now() - pg_catalog.pg_last_xact_replay_timestamp()) END,
+              'standbys', %s
+            )
+            """ % _json_list(
+            """
+            SELECT application_name, client_addr, state, sync_state,
+              pg_catalog.pg_wal_lsn_diff(pg_catalog.pg_current_wal_lsn(), replay_lsn) AS lag_bytes
+            FROM pg_catalog.pg_stat_replication
+            WHERE NOT pg_catalog.pg_is_in_recovery()
+            """ if server_version >= 100000 else
+            """
+            SELECT application_name, client_addr, state, sync_state,
+              pg_catalog.pg_xlog_location_diff(pg_catalog.pg_current_xlog_location(), replay_location) AS lag_bytes
+            FROM pg_catalog.pg_stat_replication
+            WHERE NOT pg_catalog.pg_is_in_recovery()
+            """
+        ),
+        # Tables with more dead tuples than the autovacuum threshold are waiting for a vacuum
+        "autovacuum": """
+            json_build_object(
+              'workers', (
+                SELECT count(*) FROM pg_catalog.pg_stat_activity WHERE left(query, 11) = 'autovacuum:'
+              ),
+              'tables', %s
+            )
+            """ % _json_list("""
+            SELECT s.schemaname, s.relname, s.n_live_tup, s.n_dead_tup,
+              s.n_dead_tup > current_setting('autovacuum_vacuum_threshold')::bigint +
+                current_setting('autovacuum_vacuum_scale_factor')::numeric * c.reltuples AS vacuum_pending,
+              extract(epoch FROM now() - greatest(s.last_vacuum, s.last_autovacuum))::bigint AS since_last_vacuum,
+              extract(epoch FROM now() - greatest(s.last_analyze, s.last_autoanalyze))::bigint AS since_last_analyze
+            FROM pg_catalog.pg_stat_user_tables s
+                 JOIN pg_catalog.pg_class c ON c.oid = s.relid
+            ORDER BY s.n_dead_tup DESC LIMIT %(top)s
+            """),
+    }
+    if statements_available:
+        time_column = "exec_time" if server_version >= 130000 else "time"
+        queries["statements"] = _json_list("""
+            SELECT queryid, left(query, 200) AS query, calls, total_%(t)s AS total_time, mean_%(t)s AS mean_time,
+              rows, shared_blks_hit, shared_blks_read
+            FROM pg_stat_statements
+            WHERE dbid = (SELECT oid FROM pg_catalog.pg_database WHERE datname = current_database())
+            ORDER BY total_%(t)s DESC LIMIT %%(top)s
+            """ % {'t': time_column})
+    return queries
+
+
+def _rates(previous, current):
+    interval = current['collected_at'] - previous.get('collected_at', current['collected_at'])
+    if interval <= 0:
+        return None
+
+    database = {}
+    for k in _DATABASE_COUNTERS:
+        delta = current['database'][k] - previous.get('database', {}).get(k, current['database'][k] + 1)
+        # Negative deltas mean that the statistics were reset: no rate can be computed
+        if delta >= 0:
+            database[k] = delta / interval
+    rates = {'interval': interval, 'database': database}
+    if 'blks_hit' in database and 'blks_read' in database and database['blks_hit'] + database['blks_read'] > 0:
+        rates['cache_hit_ratio'] = round(
+            database['blks_hit'] * 100.0 / (database['blks_hit'] + database['blks_read']), 2
+        )
+
+    if 'statements' in current and 'statements' in previous:
+        previous_statements = dict((str(s['queryid']), s) for s in previous['statements'])
+        rates['statements'] = []
+        for s in current['statements']:
+            p = previous_statements.get(str(s['queryid']))
+            if p is None or s['calls'] < p['calls']:
+                continue
+            calls = s['calls'] - p['calls']
+            rates['statements'].append({
+                'queryid': s['queryid'],
+                'calls': calls / interval,
+                'time': (s['total_time'] - p['total_time']) / interval,
+                'mean_time': (s['total_time'] - p['total_time']) / calls if calls > 0 else None
+            })
+    return rates
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        pooler_mode=dict(default="session", choices=["session", "transaction"]),
+        gather_subset=dict(type='list', default=["all"]),
+        top=dict(type='int', default=10),
+        long_transaction_threshold=dict(type='int', default=300),
+        snapshot_file=dict(default="")
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    subsets = module.params["gather_subset"]
+    snapshot_file = module.params["snapshot_file"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    if "all" in subsets:
+        subsets = SUBSETS
+    for s in subsets:
+        if s not in SUBSETS:
+            module.fail_json(msg="unknown subset [%s], valid subsets are: all, %s" % (s, ", ".join(SUBSETS)))
+
+    cursor = None
+    try:
+        cursor = connect(database, prepare_connection_params(module.params))
+
+        statements_available = False
+        if "statements" in subsets:
+            cursor.execute("SELECT 1 FROM pg_catalog.pg_extension WHERE extname = 'pg_stat_statements'")
+            statements_available = cursor.rowcount == 1
+
+        queries = _subset_queries(cursor.connection.server_version, statements_available)
+        selected = ["database"] + [s for s in subsets if s in queries]
+        cursor.execute(
+            "SELECT json_build_object('collected_at', extract(epoch FROM now()), %s) AS facts" %
+            ", ".join(["'%s', %s" % (s, queries[s]) for s in selected]),
+            {'top': module.params["top"], 'long_transaction_threshold': module.params["long_transaction_threshold"]}
+        )
+        facts = cursor.fetchone()['facts']
+        if not isinstance(facts, dict):
+            facts = json.loads(facts)
+
+        if snapshot_file:
+            if os.path.exists(snapshot_file):
+                with open(snapshot_file) as f:
+                    facts['rates'] = _rates(json.load(f), facts)
+            if not module.check_mode:
+                with open(snapshot_file + ".tmp", "w") as f:
+                    json.dump(dict((k, v) for k, v in facts.items() if k != 'rates'), f)
+                os.rename(snapshot_file + ".tmp", snapshot_file)
+
+        module.exit_json(changed=False, ansible_facts={'postgresql_perf': facts})
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+    except (IOError, ValueError):
+        e = get_exception()
+        module.fail_json(msg="snapshot file error: %s" % to_native(e))
+    finally:
+        if cursor:
+            cursor.connection.close()
+
+if __name__ == '__main__':
+    run_module()
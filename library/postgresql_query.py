@@ -12,15 +12,18 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
 from ansible.module_utils.pycompat24 import get_exception
 
-import ast
 import traceback
 
 from ansible.module_utils.connection import *
 from ansible.module_utils.table import *
+from ansible.module_utils.explain import *
+from ansible.module_utils.inputs import *
 
 # Needed to have pycharm autocompletition working
 try:
     from module_utils.connection import *
+    from module_utils.explain import *
+    from module_utils.inputs import *
 except:
     pass
 
@@ -57,6 +60,16 @@ options:
         description:
             - Database port to connect to.
         default: 5432
+    pooler_mode:
+        description:
+            - |
+                Use C(transaction) when connecting through a pooler in transaction mode (e.g. PgBouncer with
+                pool_mode=transaction): all the work runs in explicit transactions, no session level setting is
+                changed and the timeouts are applied with SET LOCAL
+        default: session
+        choices:
+            - session
+            - transaction
     query:
         description:
             - Query to execute
@@ -68,6 +81,47 @@ options:
                 or as dictionary (if named parameters are used).
                 Psycopg2 syntax is required for parameters.
                 See: http://initd.org/psycopg/docs/usage.html#passing-parameters-to-sql-queries
+    parameters_from_file:
+        description:
+            - |
+                Path of a JSON or YAML file on the managed host containing the parameters of the query,
+                as an alternative to parameters for large parameter sets.
+    explain:
+        description:
+            - |
+                Capture the execution plan of the query in JSON format.
+                With C(plan) the query is only planned (EXPLAIN), with C(analyze) it is executed with
+                EXPLAIN (ANALYZE, BUFFERS) and its effects are always rolled back.
+        default: ""
+        choices:
+            - plan
+            - analyze
+    explain_only:
+        description:
+            - Return only the plan, without executing the query to fetch its results
+        default: false
+    explain_top:
+        description:
+            - Number of plan nodes returned in the plan summary, ordered by time (or cost) and by buffers
+        default: 5
+    statement_timeout:
+        description:
+            - |
+                Value of the statement_timeout setting applied to the session (e.g. C(30s), C(5min) or milliseconds).
+                Statements running longer are aborted by the server.
+    lock_timeout:
+        description:
+            - Value of the lock_timeout setting applied to the session
+    idle_in_transaction_session_timeout:
+        description:
+            - Value of the idle_in_transaction_session_timeout setting applied to the session (PostgreSQL >= 9.6)
+    deadline:
+        description:
+            - |
+                Maximum execution time of the module in seconds, 0 means no limit.
+                When the deadline expires, or when the module is interrupted (e.g. by SIGTERM), the running query
+                is cancelled on the server with pg_cancel_backend() issued from a side connection.
+        default: 0
 
 extends_documentation_fragment:
     - Postgresql
@@ -98,6 +152,17 @@ EXAMPLES = '''
     query: "SELECT * FROM pg_tables WHERE tablename = %(table_name)s"
         table_name: pg_statistic
   register: query_results
+
+# Fail when the report query does not use an index on the orders table
+- postgresql_query:
+    database: my_app
+    query: "SELECT * FROM orders WHERE customer_id = %(id)s"
+    parameters:
+        id: 42
+    explain: analyze
+    explain_only: true
+  register: report_plan
+  failed_when: "report_plan.plan_summary.top_nodes[0].node_type == 'Seq Scan'"
 '''
 
 RETURN = '''
@@ -107,6 +172,12 @@ rows:
     description: list of rows. Each row is a dict indexed using the column name
 rowCount:
     description: number of rows returned by the query
+plan:
+    description: JSON execution plan of the query, returned when explain is set
+plan_summary:
+    description: |
+        summary of the plan returned when explain is set: total cost, planning and execution time and the top nodes
+        by exclusive time (or cost if the query was not analyzed) and by shared buffers accessed
 '''
 
 
@@ -118,38 +189,71 @@ def run_module():
         login_unix_socket=dict(default=""),
         database=dict(default="postgres"),
         port=dict(default="5432"),
+        pooler_mode=dict(default="session", choices=["session", "transaction"]),
         query=dict(required=True),
-        parameters=dict(default=[])
+        parameters=dict(type='raw', default=[]),
+        parameters_from_file=dict(default=""),
+        explain=dict(default="", choices=["", "plan", "analyze"]),
+        explain_only=dict(type='bool', default=False),
+        explain_top=dict(type='int', default=5),
+        statement_timeout=dict(default=""),
+        lock_timeout=dict(default=""),
+        idle_in_transaction_session_timeout=dict(default=""),
+        deadline=dict(type='int', default=0)
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[["parameters", "parameters_from_file"]],
         supports_check_mode=False
     )
 
     database = module.params["database"]
-    parameters = ast.literal_eval(module.params["parameters"])
+    explain_mode = module.params["explain"]
 
     if not postgresqldb_found:
         module.fail_json(msg="the python psycopg2 module is required")
 
+    try:
+        if module.params["parameters_from_file"]:
+            parameters = load_file_param(module.params["parameters_from_file"])
+        else:
+            parameters = structured_param(module.params["parameters"])
+    except (IOError, ValueError):
+        e = get_exception()
+        module.fail_json(msg="parameters error: %s" % to_native(e))
+
     cursor = None
     try:
-        cursor = connect(database, prepare_connection_params(module.params))
+        cursor = connect(database, prepare_connection_params(module.params), deadline=module.params["deadline"])
         cursor.connection.autocommit = False
 
         if not parameters:
             parameters = []
 
+        result = dict(changed=True)
+        if explain_mode:
+            plan = explain(cursor, module.params["query"], parameters, explain_mode)
+            # EXPLAIN ANALYZE executes the query: its effects must never be kept
+            cursor.connection.rollback()
+            result['plan'] = plan
+            result['plan_summary'] = summarize_plan(plan, module.params["explain_top"])
+            if module.params["explain_only"]:
+                result['changed'] = False
+                disarm_deadline()
+                module.exit_json(**result)
+
         cursor.execute(module.params["query"], parameters)
+        # Json encoding/decoding is needed because RealDictCursor is not handled correctly
+        # by module.exit_json in ansible 2.4
+        rows = json.loads(json.dumps(cursor.fetchall()))
+        disarm_deadline()
 
         module.exit_json(
-            changed=True,
             executed_query=cursor.query,
-            # Json encoding/decoding is needed because RealDictCursor is not handled correctly
-            # by module.exit_json in ansible 2.4
-            rows=json.loads(json.dumps(cursor.fetchall())),
-            row_count=cursor.rowcount
+            rows=rows,
+            row_count=cursor.rowcount,
+            **result
         )
 
     except psycopg2.ProgrammingError:
@@ -164,7 +268,12 @@ def run_module():
     except TypeError:
         e = get_exception()
         module.fail_json(msg="parameters error: %s" % to_native(e), exception=traceback.format_exc())
+    except KeyboardInterrupt:
+        # Raised by the signal handlers installed by connect() outside of a wait for the server
+        disarm_deadline()
+        module.fail_json(msg="deadline expired or module interrupted")
     finally:
+        disarm_deadline()
         if cursor:
             cursor.connection.rollback()
 
@@ -12,16 +12,19 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
 from ansible.module_utils.pycompat24 import get_exception
 
-import ast
 import traceback
 
 from ansible.module_utils.connection import *
 from ansible.module_utils.table import *
+from ansible.module_utils.retry import *
+from ansible.module_utils.inputs import *
 
 # Needed to have pycharm autocompletition working
 # noinspection PyBroadException
 try:
     from module_utils.connection import *
+    from module_utils.retry import *
+    from module_utils.inputs import *
 except:
     pass
 
@@ -59,6 +62,16 @@ options:
         description:
             - Database port to connect to.
         default: 5432
+    pooler_mode:
+        description:
+            - |
+                Use C(transaction) when connecting through a pooler in transaction mode (e.g. PgBouncer with
+                pool_mode=transaction): all the work runs in explicit transactions, no session level setting is
+                changed and the timeouts are applied with SET LOCAL
+        default: session
+        choices:
+            - session
+            - transaction
     schema:
         description:
             - Schema where the table is defined
@@ -69,14 +82,32 @@ options:
         required: true
     row:
         description:
-            - Dictionary with the fields of the row
-        required: true
+            - Dictionary with the fields of the row. Either row or row_from_file is required.
+    row_from_file:
+        description:
+            - Path of a JSON or YAML file on the managed host containing the dictionary with the fields of the row
     state:
         description:
             - The row state
         choices:
             - present
             - absent
+    max_attempts:
+        description:
+            - |
+                Maximum number of times the row transaction is attempted when it fails with one of
+                the retry_sqlstates errors (serialization failures, deadlocks, lock timeouts)
+        default: 3
+    retry_backoff:
+        description:
+            - |
+                Base delay in seconds between attempts. The delay doubles at each attempt and a random jitter is
+                applied to it.
+        default: 0.1
+    retry_sqlstates:
+        description:
+            - List of SQLSTATE codes that cause the transaction to be replayed
+        default: ["40001", "40P01", "55P03"]
 
 extends_documentation_fragment:
     - Postgresql
@@ -112,6 +143,12 @@ executed_query:
     description: the body of the last query sent to the backend (including bound arguments) as bytes string
 executed_command:
     description: the body of the command executed to insert the missing rows including bound arguments
+attempts:
+    description: number of times the transaction was attempted
+lsn:
+    description: |
+        WAL location after the commit, returned when the row was changed. It can be used with postgresql_wait_replay
+        to read the changes on standbys
 '''
 
 
@@ -123,26 +160,44 @@ def run_module():
         login_unix_socket=dict(default=""),
         database=dict(default="postgres"),
         port=dict(default="5432"),
+        pooler_mode=dict(default="session", choices=["session", "transaction"]),
         schema=dict(default="public"),
         table=dict(required=True),
-        row=dict(required=True),
+        row=dict(type='dict'),
+        row_from_file=dict(default=""),
         state=dict(default="present"),
+        max_attempts=dict(type='int', default=3),
+        retry_backoff=dict(type='float', default=0.1),
+        retry_sqlstates=dict(type='list', default=RETRYABLE_SQLSTATES),
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[["row", "row_from_file"]],
+        required_one_of=[["row", "row_from_file"]],
         supports_check_mode=True
     )
 
     database = module.params["database"]
     schema = module.params["schema"]
     table = module.params["table"]
-    row_columns = ast.literal_eval(module.params["row"])
     state = module.params["state"]
 
     if not postgresqldb_found:
         module.fail_json(msg="the python psycopg2 module is required")
 
+    try:
+        if module.params["row_from_file"]:
+            row_columns = load_file_param(module.params["row_from_file"])
+        else:
+            row_columns = module.params["row"]
+    except (IOError, ValueError):
+        e = get_exception()
+        module.fail_json(msg="parameters error: %s" % to_native(e))
+
+    if not isinstance(row_columns, dict) or len(row_columns) == 0:
+        module.fail_json(msg="the row must be a non empty dictionary")
+
     cursor = None
     try:
         cursor = connect(database, prepare_connection_params(module.params))
@@ -156,65 +211,79 @@ def run_module():
         sql_parameters = []
 
         col_id = 0
-        for c, v in row_columns.iteritems():
+        for c, v in row_columns.items():
             sql_identifiers['col_%d' % col_id] = sql.Identifier(c)
             sql_where.append('{%s} = %%s' % ('col_%d' % col_id))
             sql_insert_columns.append('{%s}' % ('col_%d' % col_id))
             sql_parameters.append(v)
             col_id += 1
 
-        cursor.execute("LOCK {schema}.{table}".format(schema=schema, table=table))
-
-        cursor.execute(
-            sql.SQL(
-                "SELECT COUNT(*) FROM {schema}.{table} WHERE " + " AND ".join(sql_where)
-            ).format(**sql_identifiers),
-            sql_parameters
-        )
-        executed_query = cursor.query
-        row_count = cursor.fetchone()['count']
+        def converge(cursor):
+            cursor.execute("LOCK {schema}.{table}".format(schema=schema, table=table))
 
-        if row_count > 1:
-            raise psycopg2.ProgrammingError('More than 1 one returned by selection query %s' % executed_query)
-
-        changed = False
-        if state == 'present' and row_count != 1:
-            changed = True
-        if state == 'absent' and row_count == 1:
-            changed = True
-
-        if module.check_mode or not changed:
-            cursor.connection.rollback()
-            module.exit_json(
-                changed=changed,
-                executed_query=executed_query
-            )
-
-        if state == 'present':
             cursor.execute(
                 sql.SQL(
-                    'INSERT INTO {schema}.{table} (' + ', '.join(sql_insert_columns) + ') ' +
-                    'VALUES (' + ', '.join(['%s'] * len(sql_parameters)) + ')'
+                    "SELECT COUNT(*) FROM {schema}.{table} WHERE " + " AND ".join(sql_where)
                 ).format(**sql_identifiers),
                 sql_parameters
             )
-            executed_cmd = cursor.query
-        else:
-            cursor.execute(
-                sql.SQL(
-                    'DELETE FROM {schema}.{table} WHERE ' + ' AND '.join(sql_where)
-                ).format(**sql_identifiers),
-                sql_parameters
+            executed_query = cursor.query
+            row_count = cursor.fetchone()['count']
+
+            if row_count > 1:
+                raise psycopg2.ProgrammingError('More than 1 one returned by selection query %s' % executed_query)
+
+            changed = False
+            if state == 'present' and row_count != 1:
+                changed = True
+            if state == 'absent' and row_count == 1:
+                changed = True
+
+            if module.check_mode or not changed:
+                cursor.connection.rollback()
+                return dict(
+                    changed=changed,
+                    executed_query=executed_query
+                )
+
+            if state == 'present':
+                cursor.execute(
+                    sql.SQL(
+                        'INSERT INTO {schema}.{table} (' + ', '.join(sql_insert_columns) + ') ' +
+                        'VALUES (' + ', '.join(['%s'] * len(sql_parameters)) + ')'
+                    ).format(**sql_identifiers),
+                    sql_parameters
+                )
+                executed_cmd = cursor.query
+            else:
+                cursor.execute(
+                    sql.SQL(
+                        'DELETE FROM {schema}.{table} WHERE ' + ' AND '.join(sql_where)
+                    ).format(**sql_identifiers),
+                    sql_parameters
+                )
+                executed_cmd = cursor.query
+
+            cursor.connection.commit()
+
+            return dict(
+                changed=changed,
+                executed_query=executed_query,
+                executed_command=executed_cmd,
             )
-            executed_cmd = cursor.query
-
-        cursor.connection.commit()
 
-        module.exit_json(
-            changed=changed,
-            executed_query=executed_query,
-            executed_command=executed_cmd,
+        result, attempts = run_with_retry(
+            cursor,
+            converge,
+            module.params["max_attempts"],
+            module.params["retry_backoff"],
+            # YAML gives unquoted codes like 40001 as integers
+            [str(s) for s in module.params["retry_sqlstates"]]
         )
+        if result['changed'] and not module.check_mode:
+            result['lsn'] = current_wal_lsn(cursor)
+
+        module.exit_json(attempts=attempts, **result)
 
     except psycopg2.ProgrammingError:
         e = get_exception()
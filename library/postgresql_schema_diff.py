@@ -0,0 +1,240 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.table import *
+from ansible.module_utils.parallel import *
+from ansible.module_utils.inputs import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.table import *
+    from module_utils.parallel import *
+    from module_utils.inputs import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_schema_diff
+
+short_description: report the tables of many PostGreSQL databases that differ from their declared definitions
+
+version_added: "2.4"
+
+description:
+    - "Compare the tables of several databases with the definitions (columns, primary key and owner) accepted by the
+       postgresql_table module and return a consolidated drift report"
+    - "The definitions of all the tables of a database are read from the catalog with a single query, several
+       databases are read concurrently"
+
+options:
+    databases:
+        description:
+            - List of the names of the databases, on the login host, to compare
+    dsns:
+        description:
+            - List of libpq connection strings of databases to compare, e.g. C(host=shard-12 dbname=my_app)
+    login_host:
+        description:
+            - Host running the databases.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    tables:
+        description:
+            - |
+                List of the table definitions. Each item is a dict with the keys name, schema (default public),
+                owner (not compared when empty), columns and primary_key, as the options of the postgresql_table
+                module
+    tables_from_file:
+        description:
+            - Path of a JSON or YAML file of the managed host containing the list of the table definitions
+    parallel:
+        description:
+            - Number of databases read concurrently
+        default: 8
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+   - PostgreSQL 9.4 or later is required.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Check the shard databases before a release
+- postgresql_schema_diff:
+    databases:
+      - shard_01
+      - shard_02
+    tables:
+      - name: config
+        columns:
+          - name: key
+            type: text
+            null: False
+          - name: value
+            type: text
+        primary_key:
+          - key
+  register: schema_diff
+  failed_when: not schema_diff.match
+'''
+
+RETURN = '''
+match:
+    description: true if all the tables of all the databases match their definitions
+matrix:
+    description: dict with an item for each database, a dict of booleans indexed by table (schema.name)
+drift:
+    description: |
+        dict with an item for each database with mismatching tables, a dict of differences indexed by table
+        (schema.name) in the same format of the differences returned by the postgresql_table module
+mismatched_databases:
+    description: list of the databases with at least a mismatching table
+'''
+
+
+def _check_table(table, idx):
+    if not isinstance(table, dict) or 'name' not in table:
+        return "Missing name in table definition number %d" % idx
+    col_idx = 1
+    for col in table.get('columns', []):
+        if 'name' not in col or 'type' not in col:
+            return "Missing name or type in column definition number %d of table [%s]" % (col_idx, table['name'])
+        if 'null' in col and col['null'] not in [True, False]:
+            return "Column [%s] null key of table [%s] should be a boolean value" % (col['name'], table['name'])
+        col_idx += 1
+    return None
+
+
+def _database_label(cursor):
+    p = cursor.connection.get_dsn_parameters()
+    return "%s:%s/%s" % (p.get('host', ''), p.get('port', ''), p.get('dbname', ''))
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        port=dict(default="5432"),
+        databases=dict(type='list', default=[]),
+        dsns=dict(type='list', default=[], no_log=True),
+        tables=dict(type='list', default=[]),
+        tables_from_file=dict(default=""),
+        parallel=dict(type='int', default=8)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[["tables", "tables_from_file"]],
+        required_one_of=[["databases", "dsns"], ["tables", "tables_from_file"]],
+        supports_check_mode=True
+    )
+
+    tables = module.params["tables"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    if module.params["tables_from_file"]:
+        try:
+            tables = load_file_param(module.params["tables_from_file"])
+        except (IOError, ValueError):
+            e = get_exception()
+            module.fail_json(msg="tables file error: %s" % to_native(e))
+        if not isinstance(tables, list):
+            module.fail_json(msg="tables file must contain a list of table definitions")
+
+    idx = 1
+    for table in tables:
+        error = _check_table(table, idx)
+        if error is not None:
+            module.fail_json(msg=error)
+        table.setdefault('schema', 'public')
+        idx += 1
+
+    connection_params = prepare_connection_params(module.params)
+    targets = [(d, connection_params) for d in module.params["databases"]] + \
+        [(None, {"dsn": d}) for d in module.params["dsns"]]
+    keys = [(t['schema'], t['name']) for t in tables]
+
+    def read_database(state, target):
+        cursor = connect(target[0], target[1])
+        try:
+            return target[0] or _database_label(cursor), table_definitions(cursor, keys)
+        finally:
+            cursor.connection.close()
+
+    try:
+        snapshots = parallel_map(read_database, targets, module.params["parallel"])
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+
+    matrix = {}
+    drift = {}
+    for database, definitions in snapshots:
+        matrix[database] = {}
+        for table in tables:
+            diff = {}
+            label = "%s.%s" % (table['schema'], table['name'])
+            matches = compare_table_definition(
+                definitions.get((table['schema'], table['name'])),
+                table.get('owner', ''),
+                table.get('columns', []),
+                table.get('primary_key', []),
+                diff
+            )
+            matrix[database][label] = matches and not diff['owner']
+            if not matrix[database][label]:
+                drift.setdefault(database, {})[label] = diff
+
+    module.exit_json(
+        changed=False,
+        match=len(drift) == 0,
+        matrix=matrix,
+        drift=drift,
+        mismatched_databases=sorted(drift.keys())
+    )
+
+if __name__ == '__main__':
+    run_module()
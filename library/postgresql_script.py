@@ -0,0 +1,258 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import io
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.sqlscript import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.sqlscript import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_script
+
+short_description: execute a SQL script file in a PostGreSQL database
+
+version_added: "2.4"
+
+description:
+    - "Execute the statements of a SQL script file of the managed host on a single connection, returning the duration
+       and the affected rows of each statement"
+    - "The script is read and split in statements while it is executed: semicolons in quoted strings, dollar quoted
+       strings (e.g. function bodies) and comments do not end a statement and the data lines following a
+       COPY ... FROM STDIN statement, up to the \\\\. line, are sent to the server"
+    - "The execution stops at the first failing statement, whose offset and line in the script are returned"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    script:
+        description:
+            - Path of the SQL script on the managed host
+        required: true
+    encoding:
+        description:
+            - Encoding of the script file
+        default: utf-8
+    mode:
+        description:
+            - |
+                C(transaction) executes the whole script in a single transaction, rolled back if a statement fails.
+                C(savepoint) executes each statement in a savepoint: when a statement fails only its changes are
+                rolled back and the statements executed before it are committed.
+                C(autocommit) commits each statement, e.g. for CREATE INDEX CONCURRENTLY or VACUUM.
+        default: transaction
+        choices:
+            - transaction
+            - savepoint
+            - autocommit
+    statement_timeout:
+        description:
+            - Value of the statement_timeout setting applied to the session (e.g. C(30s), C(5min) or milliseconds)
+    lock_timeout:
+        description:
+            - Value of the lock_timeout setting applied to the session
+    deadline:
+        description:
+            - |
+                Maximum execution time of the module in seconds, 0 means no limit.
+                When the deadline expires, or when the module is interrupted, the running statement is cancelled on
+                the server.
+        default: 0
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+   - psql meta-commands are not supported. The script must not contain transaction control statements (BEGIN, COMMIT)
+     unless the autocommit mode is used.
+   - In check mode the script is only split in statements.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Apply a migration in a single transaction
+- postgresql_script:
+    database: my_app
+    script: /srv/migrations/0042_orders.sql
+  register: migration
+
+# Show the statements that took more than one second
+- debug:
+    msg: "{{ migration.statements | selectattr('duration', 'gt', 1) | list }}"
+'''
+
+RETURN = '''
+statements:
+    description: |
+        list of the executed statements, each one a dict with the statement (truncated to 200 characters), its
+        offset (in characters) and line in the script, duration in seconds and rowcount (-1 when not applicable)
+failed_statement:
+    description: returned on failure, the failing statement with its offset and line in the script
+committed:
+    description: returned on failure, true if the statements executed before the failing one were committed
+duration:
+    description: total duration of the script in seconds
+'''
+
+_SAVEPOINT = "ansible_pgsql_script"
+
+
+def _describe(statement):
+    return dict(statement=statement['statement'][:200], offset=statement['offset'], line=statement['line'])
+
+
+def _execute(cursor, statement, savepoint):
+    if statement['copy_data'] is not None:
+        if savepoint:
+            cursor.execute(savepoint)
+        copy_expert(cursor, statement['statement'], statement['copy_data'])
+    else:
+        # The savepoint commands are sent with the statement, in the same round trip
+        cursor.execute((savepoint or "") + statement['statement'])
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        script=dict(required=True),
+        encoding=dict(default="utf-8"),
+        mode=dict(default="transaction", choices=["transaction", "savepoint", "autocommit"]),
+        statement_timeout=dict(default=""),
+        lock_timeout=dict(default=""),
+        deadline=dict(type='int', default=0)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    mode = module.params["mode"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    cursor = None
+    executed = []
+    statement = None
+    try:
+        script = io.open(module.params["script"], encoding=module.params["encoding"])
+    except (IOError, LookupError):
+        e = get_exception()
+        module.fail_json(msg="script error: %s" % to_native(e))
+
+    try:
+        start = time.time()
+        if module.check_mode:
+            for statement in split_script(script):
+                executed.append(_describe(statement))
+            module.exit_json(changed=len(executed) > 0, statements=executed, duration=time.time() - start)
+
+        cursor = connect(database, prepare_connection_params(module.params), deadline=module.params["deadline"])
+        cursor.connection.autocommit = mode == "autocommit"
+
+        savepoint = "SAVEPOINT %s; " % _SAVEPOINT if mode == "savepoint" else None
+        for statement in split_script(script):
+            statement_start = time.time()
+            _execute(cursor, statement, savepoint)
+            result = _describe(statement)
+            result['duration'] = time.time() - statement_start
+            result['rowcount'] = cursor.rowcount
+            executed.append(result)
+            if mode == "savepoint":
+                savepoint = "RELEASE SAVEPOINT %s; SAVEPOINT %s; " % (_SAVEPOINT, _SAVEPOINT)
+        if not cursor.connection.autocommit:
+            cursor.connection.commit()
+        disarm_deadline()
+
+        module.exit_json(changed=len(executed) > 0, statements=executed, duration=time.time() - start)
+
+    except (psycopg2.Error, KeyboardInterrupt):
+        # KeyboardInterrupt is raised by the signal handlers installed by connect() outside of a wait for the server
+        e = get_exception()
+        disarm_deadline()
+        if isinstance(e, KeyboardInterrupt):
+            msg = "deadline expired or module interrupted"
+        else:
+            msg = "database error: %s" % to_native(e)
+        committed = mode == "autocommit" and len(executed) > 0
+        if mode == "savepoint" and len(executed) > 0:
+            # Keep the statements executed before the failing one
+            try:
+                cursor.execute("ROLLBACK TO SAVEPOINT %s" % _SAVEPOINT)
+                cursor.connection.commit()
+                committed = True
+            except psycopg2.Error:
+                pass
+        module.fail_json(
+            msg=msg,
+            failed_statement=_describe(statement) if statement is not None else None,
+            statements=executed,
+            committed=committed,
+            exception=traceback.format_exc()
+        )
+    except ValueError:
+        e = get_exception()
+        module.fail_json(msg="script error: %s" % to_native(e), statements=executed)
+    finally:
+        disarm_deadline()
+        script.close()
+        if cursor:
+            cursor.connection.rollback()
+
+if __name__ == '__main__':
+    run_module()
@@ -11,17 +11,19 @@ else:
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
 from ansible.module_utils.pycompat24 import get_exception
+from ansible.module_utils.six import string_types
 
-import ast
 import traceback
 
 from ansible.module_utils.connection import *
 from ansible.module_utils.table import *
+from ansible.module_utils.inputs import *
 
 # Needed to have pycharm autocompletition working
 try:
     from module_utils.connection import *
     from module_utils.table import *
+    from module_utils.inputs import *
 except:
     pass
 
@@ -68,6 +70,16 @@ options:
         description:
             - Database port to connect to.
         default: 5432
+    pooler_mode:
+        description:
+            - |
+                Use C(transaction) when connecting through a pooler in transaction mode (e.g. PgBouncer with
+                pool_mode=transaction): all the work runs in explicit transactions, no session level setting is
+                changed and the timeouts are applied with SET LOCAL
+        default: session
+        choices:
+            - session
+            - transaction
     state:
         description:
             - The table state
@@ -77,11 +89,25 @@ options:
             - absent
     columns:
         description:
-            - List of objects with name, type and null keys
+            - List of objects with name, type and null keys, or its JSON encoding
         required: true
+    columns_from_file:
+        description:
+            - |
+                Path of a file on the managed host containing the list of columns, as an alternative to columns.
+                Supported formats, detected from the file extension, are CSV (with name, type and null header
+                fields), JSON lines (C(.jsonl)), JSON and YAML.
     primary_key:
         description:
             - List with column names composing the primary key
+    coordinate:
+        description:
+            - |
+                Coordinate hosts converging the same table concurrently.
+                The convergence runs in a single transaction holding an advisory lock keyed on schema and table name:
+                the first host does the work while the others wait for it and then skip the table introspection,
+                finding with a single fingerprint query that the table is already converged.
+        default: false
 
 extends_documentation_fragment:
     - Postgresql
@@ -120,6 +146,20 @@ EXAMPLES = '''
     primary_key:
       - key
 
+# Create the config table from all the application hosts, only one of them runs the DDL
+- postgresql_table:
+    database: my_app
+    name: config
+    coordinate: true
+    columns:
+      - {
+        name: key,
+        type: text,
+        null: False
+      }
+    primary_key:
+      - key
+
 # Ensure that the config table is not present
 - postgresql_table:
     database: my_app
@@ -147,6 +187,21 @@ logs:
 '''
 
 
+def _column_from_record(record):
+    # Null flags read from CSV files are strings
+    if isinstance(record.get('null'), string_types):
+        value = record.pop('null').strip().lower()
+        if value in ('true', 'yes', 'y', 't', '1'):
+            record['null'] = True
+        elif value in ('false', 'no', 'n', 'f', '0'):
+            record['null'] = False
+        elif value != '':
+            record['null'] = value
+    elif 'null' in record and record['null'] is None:
+        del record['null']
+    return record
+
+
 def run_module():
     module_args = dict(
         login_user=dict(default="postgres"),
@@ -154,33 +209,54 @@ def run_module():
         login_host=dict(default=""),
         login_unix_socket=dict(default=""),
         port=dict(default="5432"),
+        pooler_mode=dict(default="session", choices=["session", "transaction"]),
         name=dict(required=True),
         schema=dict(default="public"),
         owner=dict(default=""),
         database=dict(default="postgres"),
         state=dict(default="present", choices=["absent", "present"]),
-        columns=dict(default=[]),
-        primary_key=dict(default=[])
+        columns=dict(type='raw', default=[]),
+        columns_from_file=dict(default=""),
+        primary_key=dict(type='list', default=[]),
+        coordinate=dict(type='bool', default=False)
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[["columns", "columns_from_file"]],
         supports_check_mode=True
     )
 
-    columns = ast.literal_eval(module.params["columns"])
     database = module.params["database"]
     name = module.params["name"]
     owner = module.params["owner"]
-    primary_key = ast.literal_eval(module.params["primary_key"])
+    primary_key = module.params["primary_key"]
     schema = module.params["schema"]
     state = module.params["state"]
 
     if not postgresqldb_found:
         module.fail_json(msg="the python psycopg2 module is required")
 
+    if module.params["columns_from_file"]:
+        try:
+            columns = [_column_from_record(r) for r in iter_file_records(module.params["columns_from_file"])]
+        except (IOError, ValueError):
+            e = get_exception()
+            module.fail_json(msg="columns file error: %s" % to_native(e))
+    else:
+        try:
+            columns = structured_param(module.params["columns"]) or []
+        except ValueError:
+            e = get_exception()
+            module.fail_json(msg="columns error: %s" % to_native(e))
+        if not isinstance(columns, list):
+            module.fail_json(msg="columns should be a list of column definitions")
+
     idx = 1
     for col in columns:
+        if not isinstance(col, dict):
+            module.fail_json(msg="Column definition number %d should be an object with name, type and null keys" % idx)
+
         if 'name' not in col.keys():
             module.fail_json(msg="Missing name in column definition number %d" % idx)
 
@@ -198,6 +274,23 @@ def run_module():
     cursor = None
     try:
         cursor = connect(database, prepare_connection_params(module.params))
+
+        if module.params["coordinate"] and not module.check_mode:
+            cursor.connection.autocommit = False
+            lock_table_convergence(cursor, schema, name)
+            if state == "present" and \
+                    table_fingerprint(cursor, schema, name, owner) == build_table_fingerprint(columns, primary_key, owner):
+                cursor.connection.rollback()
+                module.exit_json(
+                    changed=False,
+                    table=name,
+                    schema=schema,
+                    owner=owner,
+                    differences={},
+                    columns=columns,
+                    logs=["table already converged"]
+                )
+
         diff = {}
         table_checks = table_matches(cursor, schema, name, owner, columns, primary_key, diff)
         logs = []
@@ -218,7 +311,8 @@ def run_module():
                 columns=columns
             )
 
-        cursor.connection.autocommit = False
+        if cursor.connection.autocommit:
+            cursor.connection.autocommit = False
         changed = False
 
         if state == "absent" and diff['exists']:
@@ -259,7 +353,7 @@ def run_module():
                     )
                 )
 
-            for col_to_drop, col_status in diff['existing_columns'].iteritems():
+            for col_to_drop, col_status in diff['existing_columns'].items():
                 if col_status is not True:
                     cursor.execute(
                         sql.SQL("ALTER TABLE {schema}.{name} DROP COLUMN {col}").format(
@@ -0,0 +1,296 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+    from psycopg2 import sql
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+from ansible.module_utils.six import integer_types, string_types
+
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.table import *
+from ansible.module_utils.parallel import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.table import *
+    from module_utils.parallel import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_table_checksum
+
+short_description: compare the data of two PostGreSQL tables computing checksums of primary key ranges
+
+version_added: "2.4"
+
+description:
+    - "Compare the data of a table with the data of a table in another database (or of the same table on a standby)"
+    - "The source table is split in ranges of its primary key. The checksum of each range is computed server side on
+       both databases by several parallel connections and only the mismatching ranges are returned"
+    - "Rows are compared by their text representation, with the same TimeZone, DateStyle, IntervalStyle,
+       extra_float_digits and bytea_output settings on both databases"
+    - "Each range is checksummed in its own transaction: tables modified during the comparison can report spurious
+       mismatches"
+
+options:
+    database:
+        description:
+            - Name of the source database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the source database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    schema:
+        description:
+            - Schema of the source table
+        default: public
+    table:
+        description:
+            - Name of the source table. It must have a primary key.
+        required: true
+    target_dsn:
+        description:
+            - |
+                libpq connection string of the target database,
+                e.g. C(host=db-replica dbname=my_app user=checker)
+        required: true
+    target_schema:
+        description:
+            - Schema of the target table, defaults to schema
+    target_table:
+        description:
+            - Name of the target table, defaults to table
+    algorithm:
+        description:
+            - |
+                Checksum computed for each range: C(md5) of the ordered md5 of each row text representation or
+                C(hashtext), the sum of the hashtext() of each row, which is faster but weaker
+        default: md5
+        choices:
+            - md5
+            - hashtext
+    chunk_size:
+        description:
+            - Number of rows of each primary key range
+        default: 10000
+    parallel:
+        description:
+            - Number of workers computing the checksums, each one with a connection to both databases
+        default: 4
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Verify that the orders table was copied to the new cluster
+- postgresql_table_checksum:
+    database: my_app
+    table: orders
+    target_dsn: "host=new-cluster dbname=my_app user=postgres"
+    parallel: 8
+  register: orders_checksum
+  failed_when: not orders_checksum.match
+'''
+
+RETURN = '''
+match:
+    description: true if all the ranges have the same checksum in both tables
+chunks:
+    description: number of primary key ranges compared
+source_rows:
+    description: number of rows in the source table
+target_rows:
+    description: number of rows in the target table
+mismatches:
+    description: |
+        list of the mismatching ranges. Each item is a dict with the lower (excluded) and upper (included) primary key
+        values of the range, null when unbounded, and the number of rows of the range in both tables
+'''
+
+
+# The text of the rows depends on these settings: they are the same on both sides whatever the server configuration
+_SESSION_SETTINGS = (
+    ("TimeZone", "UTC"),
+    ("DateStyle", "ISO, MDY"),
+    ("IntervalStyle", "postgres"),
+    ("extra_float_digits", "3"),
+    ("bytea_output", "hex")
+)
+
+
+def _setup_session(cursor):
+    for name, value in _SESSION_SETTINGS:
+        cursor.execute("SELECT pg_catalog.set_config(%s, %s, false)", (name, value))
+    return cursor
+
+
+def _collatable_columns(cursor, schema, table):
+    cursor.execute(
+        """
+        SELECT a.attname
+        FROM pg_catalog.pg_attribute a
+             JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+             JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND a.attnum > 0 AND a.attcollation <> 0;
+        """,
+        (schema, table)
+    )
+    return set(r['attname'] for r in cursor.fetchall())
+
+
+def _checksum_query(algorithm, schema, table, key_columns, collatable_columns, condition):
+    # Text keys are ordered byte-wise, the collations of the two databases could differ
+    key = sql.SQL(", ").join([
+        sql.SQL("{column} COLLATE \"C\"" if c in collatable_columns else "{column}").format(column=sql.Identifier(c))
+        for c in key_columns
+    ])
+    if algorithm == "md5":
+        checksum = sql.SQL("md5(coalesce(string_agg(md5(t::text), '' ORDER BY {key}), ''))").format(key=key)
+    else:
+        checksum = sql.SQL("coalesce(sum(hashtext(t::text)::bigint), 0)::text")
+    return sql.SQL(
+        "SELECT count(*) AS row_count, {checksum} AS checksum FROM {schema}.{table} t WHERE {condition}"
+    ).format(
+        checksum=checksum,
+        schema=sql.Identifier(schema),
+        table=sql.Identifier(table),
+        condition=condition
+    )
+
+
+def _json_key(values):
+    if values is None:
+        return None
+    return [v if isinstance(v, integer_types + string_types) else to_native(v) for v in values]
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        schema=dict(default="public"),
+        table=dict(required=True),
+        target_dsn=dict(required=True, no_log=True),
+        target_schema=dict(default=""),
+        target_table=dict(default=""),
+        algorithm=dict(default="md5", choices=["md5", "hashtext"]),
+        chunk_size=dict(type='int', default=10000),
+        parallel=dict(type='int', default=4)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    schema = module.params["schema"]
+    table = module.params["table"]
+    target_schema = module.params["target_schema"] or schema
+    target_table = module.params["target_table"] or table
+    algorithm = module.params["algorithm"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    connection_params = prepare_connection_params(module.params)
+
+    cursor = None
+    try:
+        cursor = connect(database, connection_params)
+        key_columns = primary_key_columns(cursor, schema, table)
+        if len(key_columns) == 0:
+            module.fail_json(msg="table %s.%s does not exist or has no primary key" % (schema, table))
+        collatable_columns = _collatable_columns(cursor, schema, table)
+        ranges = primary_key_ranges(cursor, schema, table, key_columns, module.params["chunk_size"])
+        cursor.connection.close()
+
+        def setup():
+            return (
+                _setup_session(connect(database, connection_params)),
+                _setup_session(connect(None, {"dsn": module.params["target_dsn"]}))
+            )
+
+        def teardown(cursors):
+            for c in cursors:
+                c.connection.close()
+
+        def checksum(cursors, key_range):
+            condition, parameters = primary_key_range_condition(key_columns, key_range[0], key_range[1])
+            result = []
+            for c, s, t in zip(cursors, (schema, target_schema), (table, target_table)):
+                c.execute(_checksum_query(algorithm, s, t, key_columns, collatable_columns, condition), parameters)
+                result.append(c.fetchone())
+            return result
+
+        checksums = parallel_map(checksum, ranges, module.params["parallel"], setup, teardown)
+
+        mismatches = []
+        for key_range, (source, target) in zip(ranges, checksums):
+            if source['row_count'] != target['row_count'] or source['checksum'] != target['checksum']:
+                mismatches.append({
+                    'lower': _json_key(key_range[0]),
+                    'upper': _json_key(key_range[1]),
+                    'source_rows': source['row_count'],
+                    'target_rows': target['row_count']
+                })
+
+        module.exit_json(
+            changed=False,
+            match=len(mismatches) == 0,
+            chunks=len(ranges),
+            source_rows=sum(c[0]['row_count'] for c in checksums),
+            target_rows=sum(c[1]['row_count'] for c in checksums),
+            mismatches=mismatches
+        )
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+
+if __name__ == '__main__':
+    run_module()
@@ -0,0 +1,227 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+    from psycopg2 import sql
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import re
+import select
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+from ansible.module_utils.inputs import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+    from module_utils.inputs import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_wait
+
+short_description: wait for a notification on a PostGreSQL channel
+
+version_added: "2.4"
+
+description:
+    - "LISTEN on a PostGreSQL channel and wait until a notification with a matching payload arrives"
+    - "The module blocks on the connection socket, so no query is executed while waiting"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the database.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    channel:
+        description:
+            - Name of the channel to LISTEN on
+        required: true
+    payload:
+        description:
+            - Regular expression searched in the notification payload. When empty any notification is accepted.
+    condition:
+        description:
+            - |
+                Query executed once after the LISTEN command. If the first column of the first returned row is true
+                the module returns immediately without waiting for a notification.
+                It allows to detect events happened before the module started listening.
+    parameters:
+        description:
+            - |
+                Parameters of the condition query as list (if positional parameters are used in query)
+                or as dictionary (if named parameters are used).
+                Psycopg2 syntax is required for parameters.
+                See: http://initd.org/psycopg/docs/usage.html#passing-parameters-to-sql-queries
+    timeout:
+        description:
+            - Maximum number of seconds to wait for the notification. The module fails when it expires.
+        default: 300
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+# Wait up to 10 minutes for the migration job to notify its completion on the "jobs" channel.
+# The condition handles the case of a job already finished before the module started listening.
+- postgresql_wait:
+    database: my_app
+    channel: jobs
+    payload: "^migration-42:done$"
+    condition: "SELECT status = 'done' FROM jobs WHERE id = %(id)s"
+    parameters:
+        id: 42
+    timeout: 600
+  register: migration
+'''
+
+RETURN = '''
+matched_by:
+    description: C(condition) if the condition query was satisfied, C(notification) otherwise
+channel:
+    description: channel of the received notification
+payload:
+    description: payload of the received notification
+pid:
+    description: PID of the backend that sent the notification
+elapsed:
+    description: number of seconds waited
+'''
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        channel=dict(required=True),
+        payload=dict(default=""),
+        condition=dict(default=""),
+        parameters=dict(type='raw', default=[]),
+        timeout=dict(type='int', default=300)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    channel = module.params["channel"]
+    condition = module.params["condition"]
+    timeout = module.params["timeout"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    try:
+        payload = re.compile(module.params["payload"]) if module.params["payload"] else None
+    except re.error:
+        e = get_exception()
+        module.fail_json(msg="invalid payload regular expression: %s" % to_native(e))
+
+    try:
+        parameters = structured_param(module.params["parameters"])
+    except ValueError:
+        e = get_exception()
+        module.fail_json(msg="parameters error: %s" % to_native(e))
+
+    cursor = None
+    try:
+        cursor = connect(database, prepare_connection_params(module.params))
+        connection = cursor.connection
+        start = time.time()
+
+        # LISTEN before evaluating the condition: no notification sent in between can be lost
+        cursor.execute(sql.SQL("LISTEN {channel}").format(channel=sql.Identifier(channel)))
+
+        if condition:
+            cursor.execute(condition, parameters or [])
+            row = cursor.fetchone()
+            if row and row[cursor.description[0][0]]:
+                module.exit_json(
+                    changed=False,
+                    matched_by="condition",
+                    elapsed=time.time() - start
+                )
+
+        while True:
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                if payload is None or payload.search(notify.payload):
+                    module.exit_json(
+                        changed=False,
+                        matched_by="notification",
+                        channel=notify.channel,
+                        payload=notify.payload,
+                        pid=notify.pid,
+                        elapsed=time.time() - start
+                    )
+
+            remaining = start + timeout - time.time()
+            if remaining <= 0:
+                module.fail_json(
+                    msg="timeout waiting for a notification on channel %s" % channel,
+                    elapsed=time.time() - start
+                )
+
+            if select.select([connection], [], [], remaining) != ([], [], []):
+                connection.poll()
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+    except TypeError:
+        e = get_exception()
+        module.fail_json(msg="parameters error: %s" % to_native(e))
+    finally:
+        if cursor:
+            cursor.connection.close()
+
+if __name__ == '__main__':
+    run_module()
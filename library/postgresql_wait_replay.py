@@ -0,0 +1,228 @@
+#!/usr/bin/python
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    postgresqldb_found = False
+else:
+    postgresqldb_found = True
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+from ansible.module_utils.pycompat24 import get_exception
+
+import time
+import traceback
+
+from ansible.module_utils.connection import *
+
+# Needed to have pycharm autocompletition working
+try:
+    from module_utils.connection import *
+except:
+    pass
+
+DOCUMENTATION = '''
+---
+module: postgresql_wait_replay
+
+short_description: wait until PostGreSQL standbys have replayed a WAL location
+
+version_added: "2.4"
+
+description:
+    - "Wait until the standbys streaming from a primary server have replayed the WAL up to a given location"
+    - "The location is usually the lsn returned by postgresql_command or postgresql_row, so that the following tasks
+       reading from the standbys see the changes (read-your-writes)"
+    - "The primary server is polled through pg_stat_replication with an increasing delay, up to poll_interval"
+
+options:
+    database:
+        description:
+            - Name of the database to connect to.
+        default: postgres
+    login_host:
+        description:
+            - Host running the primary database server.
+        default: localhost
+    login_password:
+        description:
+            - The password used to authenticate with.
+    login_unix_socket:
+        description:
+            - Path to a Unix domain socket for local connections.
+    login_user:
+        description:
+            - The username used to authenticate with.
+    port:
+        description:
+            - Database port to connect to.
+        default: 5432
+    lsn:
+        description:
+            - WAL location to wait for. When empty the module returns immediately.
+        required: true
+    standbys:
+        description:
+            - |
+                List with the application_name of the standbys to wait for.
+                When empty all the standbys connected to the primary are waited for, see min_standbys.
+    min_standbys:
+        description:
+            - |
+                Minimum number of standbys that must be connected and caught up when standbys is empty: with no
+                standby connected the module waits until the timeout. Use 0 to succeed on a primary without standbys.
+        default: 1
+    max_lag:
+        description:
+            - Number of bytes a standby may still have to replay before lsn to be considered caught up
+        default: 0
+    timeout:
+        description:
+            - Maximum number of seconds to wait. The module fails when it expires.
+        default: 60
+    poll_interval:
+        description:
+            - Maximum delay in seconds between two checks of pg_stat_replication
+        default: 1
+
+extends_documentation_fragment:
+    - Postgresql
+
+notes:
+   - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
+     the host before using this module. If the remote host is the PostgreSQL server (which is the default case),
+     then PostgreSQL must also be installed on the remote host.
+     For Ubuntu-based systems, install the C(postgresql), C(libpq-dev), and C(python-psycopg2) packages
+     on the remote host before using this module.
+
+requirements: [ psycopg2 ]
+
+author:
+    - Denis Gasparin (@rtshome)
+'''
+
+EXAMPLES = '''
+---
+- postgresql_row:
+    database: my_app_config
+    login_host: db-primary
+    table: app_config
+    row:
+        key: environment
+        value: production
+  register: config_row
+
+# Wait for the standbys used by the application before reading the configuration from them
+- postgresql_wait_replay:
+    login_host: db-primary
+    lsn: "{{ config_row.lsn | default('') }}"
+    standbys:
+      - db-replica-1
+      - db-replica-2
+    timeout: 30
+'''
+
+RETURN = '''
+standbys:
+    description: |
+        List with the replay status of the waited standbys. Each item is a dict with name, replay_lsn, lag_bytes
+        (bytes still to be replayed before lsn) and caught_up keys
+elapsed:
+    description: number of seconds waited
+'''
+
+
+def _replication_status_query(server_version):
+    if server_version >= 100000:
+        return """
+            SELECT application_name AS name, replay_lsn::text AS replay_lsn,
+              pg_catalog.pg_wal_lsn_diff(%s, replay_lsn) AS lag_bytes
+            FROM pg_catalog.pg_stat_replication
+            """
+    return """
+        SELECT application_name AS name, replay_location::text AS replay_lsn,
+          pg_catalog.pg_xlog_location_diff(%s, replay_location) AS lag_bytes
+        FROM pg_catalog.pg_stat_replication
+        """
+
+
+def _standbys_status(cursor, lsn, names, max_lag):
+    cursor.execute(_replication_status_query(cursor.connection.server_version), (lsn,))
+    standbys = dict((r['name'], r) for r in cursor.fetchall() if len(names) == 0 or r['name'] in names)
+    status = []
+    for name in (names if len(names) > 0 else sorted(standbys.keys())):
+        s = standbys.get(name, {'replay_lsn': None, 'lag_bytes': None})
+        lag = float(s['lag_bytes']) if s['lag_bytes'] is not None else None
+        status.append({
+            'name': name,
+            'replay_lsn': s['replay_lsn'],
+            'lag_bytes': lag,
+            'caught_up': lag is not None and lag <= max_lag
+        })
+    return status
+
+
+def run_module():
+    module_args = dict(
+        login_user=dict(default="postgres"),
+        login_password=dict(default="", no_log=True),
+        login_host=dict(default=""),
+        login_unix_socket=dict(default=""),
+        database=dict(default="postgres"),
+        port=dict(default="5432"),
+        lsn=dict(required=True),
+        standbys=dict(type='list', default=[]),
+        min_standbys=dict(type='int', default=1),
+        max_lag=dict(type='int', default=0),
+        timeout=dict(type='int', default=60),
+        poll_interval=dict(type='float', default=1)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    database = module.params["database"]
+    lsn = module.params["lsn"]
+    names = module.params["standbys"]
+
+    if not postgresqldb_found:
+        module.fail_json(msg="the python psycopg2 module is required")
+
+    if not lsn:
+        module.exit_json(changed=False, standbys=[], elapsed=0)
+
+    cursor = None
+    try:
+        cursor = connect(database, prepare_connection_params(module.params))
+        start = time.time()
+        delay = 0.01
+
+        while True:
+            status = _standbys_status(cursor, lsn, names, module.params["max_lag"])
+            # A standby disconnected at this time is not listed by pg_stat_replication
+            if len(status) >= module.params["min_standbys"] and all(s['caught_up'] for s in status):
+                module.exit_json(changed=False, standbys=status, elapsed=time.time() - start)
+
+            remaining = start + module.params["timeout"] - time.time()
+            if remaining <= 0:
+                module.fail_json(
+                    msg="timeout waiting for standbys to replay WAL location %s" % lsn,
+                    standbys=status,
+                    elapsed=time.time() - start
+                )
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, module.params["poll_interval"])
+
+    except psycopg2.DatabaseError:
+        e = get_exception()
+        module.fail_json(msg="database error: %s" % to_native(e), exception=traceback.format_exc())
+    finally:
+        if cursor:
+            cursor.connection.close()
+
+if __name__ == '__main__':
+    run_module()
@@ -1,5 +1,30 @@
 import psycopg2
 import psycopg2.extras
+import signal
+
+_session_timeouts = ("statement_timeout", "lock_timeout", "idle_in_transaction_session_timeout")
+
+
+class PoolerConnection(psycopg2.extensions.connection):
+    """
+    Connection going through a pooler in transaction mode (e.g. PgBouncer with pool_mode=transaction), where
+    consecutive transactions can run on different backends: autocommit is never enabled and local_settings are applied
+    with SET LOCAL at the beginning of each transaction instead of being set on the session.
+    """
+    local_settings = {}
+
+
+class _PoolerCursor(psycopg2.extras.RealDictCursor):
+    def execute(self, query, vars=None):
+        connection = self.connection
+        if connection.local_settings and not connection.autocommit and \
+                connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            names = sorted(connection.local_settings.keys())
+            super(_PoolerCursor, self).execute(
+                "SELECT " + ", ".join(["pg_catalog.set_config(%s, %s, true)"] * len(names)),
+                [v for k in names for v in (k, str(connection.local_settings[k]))]
+            )
+        return super(_PoolerCursor, self).execute(query, vars)
 
 
 def prepare_connection_params(params):
@@ -16,17 +41,112 @@ def prepare_connection_params(params):
     if is_localhost and params["login_unix_socket"] != "":
         kw["host"] = params["login_unix_socket"]
 
+    if params.get("pooler_mode", "session") == "transaction":
+        # Poolers reject the options startup parameter and session settings would leak to other clients
+        kw["connection_factory"] = type("PoolerConnection", (PoolerConnection,), {
+            "local_settings": dict((k, params[k]) for k in _session_timeouts if params.get(k, "") != "")
+        })
+        return kw
+
+    # Timeouts are sent in the startup packet so they are applied to the session without additional round trips
+    options = [
+        "-c %s=%s" % (k, _escape_option_value(params[k]))
+        for k in _session_timeouts if params.get(k, "") != ""
+    ]
+    if options:
+        kw["options"] = " ".join(options)
+
     return kw
 
 
-def connect(database, params):
+def _escape_option_value(value):
+    return str(value).replace("\\", "\\\\").replace(" ", "\\ ")
+
+
+def cancel_backend(database, params, backend_pid):
+    """Best-effort cancellation of the statement running on backend_pid, issued from a side connection"""
+    side_connection = None
+    try:
+        side_connection = psycopg2.connect(database=database, **params)
+        side_connection.autocommit = True
+        side_connection.cursor().execute("SELECT pg_catalog.pg_cancel_backend(%s)", (backend_pid,))
+    except psycopg2.Error:
+        pass
+    finally:
+        if side_connection:
+            side_connection.close()
+
+
+def _guard_backend(db_connection, database, params, deadline):
+    backend_pid = db_connection.get_backend_pid()
+    # Through a pooler the backend pid is not known: wait_select() sends a cancel request on the connection itself
+    pooled = isinstance(db_connection, PoolerConnection)
+
+    def _interrupt(signum, frame):
+        if not pooled:
+            cancel_backend(database, params, backend_pid)
+        # wait_select() handles KeyboardInterrupt waiting for the server to abort the running statement
+        raise KeyboardInterrupt()
+
+    for s in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGALRM):
+        signal.signal(s, _interrupt)
+    if deadline > 0:
+        signal.alarm(deadline)
+
+
+def disarm_deadline():
+    """Stop the deadline timer and restore the default handlers of the signals guarded by connect()"""
+    signal.alarm(0)
+    for s in (signal.SIGTERM, signal.SIGHUP, signal.SIGALRM):
+        signal.signal(s, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+
+def connect(database, params, deadline=None):
+    # When a deadline is given the statements running on the connection are cancelled server side if the module
+    # is interrupted or if the deadline (in seconds, 0 means no deadline) expires.
+    # The wait callback gives control back to the interpreter while waiting for the server, so signals are handled.
+    if deadline is not None:
+        psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
     db_connection = psycopg2.connect(database=database, **params)
-    # Enable autocommit so we can create databases
-    if psycopg2.__version__ >= '2.4.2':
-        db_connection.autocommit = True
+    if isinstance(db_connection, PoolerConnection):
+        # Each unit of work must run in an explicit transaction, pinned to a single backend by the pooler
+        cursor_factory = _PoolerCursor
     else:
-        db_connection.set_isolation_level(psycopg2
-                                          .extensions
-                                          .ISOLATION_LEVEL_AUTOCOMMIT)
-    cursor = db_connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor_factory = psycopg2.extras.RealDictCursor
+        # Enable autocommit so we can create databases
+        if psycopg2.__version__ >= '2.4.2':
+            db_connection.autocommit = True
+        else:
+            db_connection.set_isolation_level(psycopg2
+                                              .extensions
+                                              .ISOLATION_LEVEL_AUTOCOMMIT)
+    if deadline is not None:
+        _guard_backend(db_connection, database, params, deadline)
+
+    cursor = db_connection.cursor(cursor_factory=cursor_factory)
     return cursor
+
+
+def copy_expert(cursor, statement, data):
+    """
+    Execute a COPY statement with cursor.copy_expert(), which psycopg2 refuses while a wait callback is installed.
+    The callback installed by connect() is removed during the copy: the deadline is still enforced by the signal
+    handlers, that cancel the statement from a side connection and interrupt the copy while data is read.
+    """
+    wait_callback = psycopg2.extensions.get_wait_callback()
+    psycopg2.extensions.set_wait_callback(None)
+    try:
+        cursor.copy_expert(statement, data)
+    finally:
+        psycopg2.extensions.set_wait_callback(wait_callback)
+
+
+def current_wal_lsn(cursor):
+    """Current WAL write location of the server, to be waited for on the standbys"""
+    if cursor.connection.server_version >= 100000:
+        cursor.execute("SELECT pg_catalog.pg_current_wal_lsn()::text AS lsn")
+    else:
+        cursor.execute("SELECT pg_catalog.pg_current_xlog_location()::text AS lsn")
+    return cursor.fetchone()['lsn']
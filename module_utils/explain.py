@@ -0,0 +1,86 @@
+import json
+
+
+def explain(cursor, statement, parameters, mode):
+    """
+    Run EXPLAIN on statement and return its JSON plan.
+    With mode "analyze" the statement is actually executed (EXPLAIN ANALYZE with BUFFERS): the caller must roll back
+    the transaction afterwards to discard its effects.
+    """
+    options = ["FORMAT JSON"]
+    if mode == "analyze":
+        options = ["ANALYZE", "BUFFERS"] + options
+
+    cursor.execute("EXPLAIN (%s) %s" % (", ".join(options), statement), parameters)
+    plan = cursor.fetchone()['QUERY PLAN']
+    # Older psycopg2 versions don't decode json columns
+    if not isinstance(plan, list):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def _node_summary(node):
+    loops = node.get('Actual Loops', 1)
+    summary = {
+        'node_type': node['Node Type'],
+        'relation': node.get('Relation Name', node.get('Index Name')),
+        'total_cost': node['Total Cost'],
+        'plan_rows': node['Plan Rows'],
+        'exclusive_cost': node['Total Cost'],
+        'exclusive_time': None,
+        'actual_rows': None,
+        'loops': None,
+        'shared_hit_blocks': node.get('Shared Hit Blocks'),
+        'shared_read_blocks': node.get('Shared Read Blocks'),
+    }
+    if 'Actual Total Time' in node:
+        summary['exclusive_time'] = node['Actual Total Time'] * loops
+        summary['actual_rows'] = node['Actual Rows'] * loops
+        summary['loops'] = loops
+
+    # Costs, timings and buffers reported by EXPLAIN include the children nodes
+    for child in node.get('Plans', []):
+        summary['exclusive_cost'] -= child['Total Cost']
+        if summary['exclusive_time'] is not None and 'Actual Total Time' in child:
+            summary['exclusive_time'] -= child['Actual Total Time'] * child.get('Actual Loops', 1)
+        for k, v in (('shared_hit_blocks', 'Shared Hit Blocks'), ('shared_read_blocks', 'Shared Read Blocks')):
+            if summary[k] is not None and v in child:
+                summary[k] -= child[v]
+
+    return summary
+
+
+def _collect_nodes(node, nodes):
+    nodes.append(_node_summary(node))
+    for child in node.get('Plans', []):
+        _collect_nodes(child, nodes)
+
+
+def summarize_plan(plan, top=5):
+    """
+    Summarize a JSON plan returned by explain() in the top nodes by exclusive time (or exclusive cost when the plan
+    was not analyzed) and in the top nodes by buffers accessed
+    """
+    nodes = []
+    _collect_nodes(plan['Plan'], nodes)
+
+    analyzed = 'Execution Time' in plan
+    if analyzed:
+        by_time = sorted(nodes, key=lambda n: n['exclusive_time'], reverse=True)
+    else:
+        by_time = sorted(nodes, key=lambda n: n['exclusive_cost'], reverse=True)
+    by_buffers = sorted(
+        [n for n in nodes if n['shared_hit_blocks'] is not None],
+        key=lambda n: n['shared_hit_blocks'] + n['shared_read_blocks'],
+        reverse=True
+    )
+
+    return {
+        'analyzed': analyzed,
+        'total_cost': plan['Plan']['Total Cost'],
+        'planning_time': plan.get('Planning Time'),
+        'execution_time': plan.get('Execution Time'),
+        'nodes': len(nodes),
+        'top_nodes': by_time[:top],
+        'top_buffers': by_buffers[:top],
+    }
@@ -0,0 +1,79 @@
+import csv
+import json
+import os
+
+from ansible.module_utils.six import string_types
+
+try:
+    import yaml
+except ImportError:
+    yaml_found = False
+else:
+    yaml_found = True
+
+
+def _file_format(path, file_format):
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'yml': 'yaml', 'ndjson': 'jsonl'}.get(extension, extension)
+
+
+def _load_document(f, file_format):
+    if file_format == 'json':
+        return json.load(f)
+    if file_format == 'yaml':
+        if not yaml_found:
+            raise ValueError("the python yaml module is required to read YAML files")
+        return yaml.safe_load(f)
+    raise ValueError("unsupported file format [%s]" % file_format)
+
+
+def structured_param(value):
+    """Value of a list or dict module parameter, decoding it from JSON when it was given as a string"""
+    if isinstance(value, string_types):
+        return json.loads(value) if value.strip() else None
+    return value
+
+
+def load_file_param(path, file_format=None):
+    """Load a module parameter from a JSON or YAML file of the managed host"""
+    file_format = _file_format(path, file_format)
+    with open(path) as f:
+        return _load_document(f, file_format)
+
+
+def iter_file_records(path, file_format=None):
+    """
+    Iterate over the records stored in a file of the managed host.
+    CSV files (one dict per line, keys are taken from the header line and empty fields are None) and JSON lines files
+    (one JSON value per line) are streamed without loading the whole file in memory.
+    JSON and YAML files must contain a list of records.
+    """
+    file_format = _file_format(path, file_format)
+    with open(path) as f:
+        if file_format == 'csv':
+            for record in csv.DictReader(f):
+                yield dict((k, v if v != '' else None) for k, v in record.items())
+        elif file_format == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            records = _load_document(f, file_format)
+            if not isinstance(records, list):
+                raise ValueError("file %s must contain a list of records" % path)
+            for record in records:
+                yield record
+
+
+def chunks(iterable, size):
+    """Split iterable in lists of at most size items"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+import uuid
+
+import psycopg2
+
+from ansible.module_utils.connection import connect
+
+DEFAULT_JOB_DIR = "~/.ansible_pgsql_jobs"
+
+
+def job_state_file(job_dir, job_id):
+    return os.path.join(os.path.expanduser(job_dir), job_id + ".json")
+
+
+def read_job(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_job(path, state):
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.rename(path + ".tmp", path)
+
+
+def phase_first_seen(path, progress):
+    """
+    Return the time and the percent done of the first observation of the current phase of the job, given its progress
+    from backend_progress(). The observations are recorded in a file next to the state file, which is rewritten by the
+    daemon. Returns None when the phase is observed for the first time.
+    """
+    phase_file = path + ".phase"
+    current = dict(command=progress['command'], phase=progress['phase'])
+    try:
+        seen = read_job(phase_file)
+    except (IOError, ValueError):
+        seen = None
+    if seen is not None and all(seen.get(k) == v for k, v in current.items()):
+        return seen
+    current.update(seen=time.time(), percent=progress['percent'])
+    _write_job(phase_file, current)
+    return None
+
+
+def forget_phase(path):
+    try:
+        os.remove(path + ".phase")
+    except OSError:
+        pass
+
+
+def _run_job(path, notify_fd, state, database, params, statement, parameters):
+    # The module output is read until all the processes holding it are closed
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null_fd, fd)
+
+    try:
+        cursor = connect(database, params)
+        state.update(backend_pid=cursor.connection.get_backend_pid(), status="running", started=time.time())
+        _write_job(path, state)
+    except (psycopg2.Error, IOError, OSError) as e:
+        os.write(notify_fd, json.dumps({'error': str(e)}).encode('utf-8'))
+        os.close(notify_fd)
+        return
+    os.write(notify_fd, json.dumps(state).encode('utf-8'))
+    os.close(notify_fd)
+
+    try:
+        cursor.execute(statement, parameters)
+        if not cursor.connection.autocommit:
+            cursor.connection.commit()
+        state.update(status="finished", rowcount=cursor.rowcount)
+    except psycopg2.Error as e:
+        state.update(status="failed", error=str(e).strip())
+    state['ended'] = time.time()
+    _write_job(path, state)
+    cursor.connection.close()
+
+
+def start_job(job_dir, database, params, statement, parameters):
+    """
+    Execute statement in a daemon process detached from the module, on its own autocommit connection, so that it is
+    not lost if the module (or the Ansible connection) ends. The state of the job is kept in a JSON file of job_dir.
+    Returns the job state once the daemon is connected: job_id, state_file, pid of the daemon and backend_pid.
+    Raises IOError if the daemon could not connect.
+    """
+    job_dir = os.path.abspath(os.path.expanduser(job_dir))
+    if not os.path.isdir(job_dir):
+        os.makedirs(job_dir)
+    job_id = uuid.uuid4().hex
+    path = job_state_file(job_dir, job_id)
+    state = dict(
+        job_id=job_id,
+        state_file=path,
+        database=database,
+        statement=statement[:200],
+        status="starting"
+    )
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Double fork: the daemon is not a child of the module and has no controlling terminal
+        os.close(read_fd)
+        os.setsid()
+        if os.fork() == 0:
+            try:
+                state['pid'] = os.getpid()
+                _run_job(path, write_fd, state, database, params, statement, parameters)
+            finally:
+                os._exit(0)
+        os._exit(0)
+
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    message = b''
+    while True:
+        data = os.read(read_fd, 65536)
+        if not data:
+            break
+        message += data
+    os.close(read_fd)
+
+    result = json.loads(message.decode('utf-8')) if message else {'error': "the job process ended unexpectedly"}
+    if 'error' in result:
+        raise IOError(result['error'])
+    return result
@@ -0,0 +1,49 @@
+import sys
+import threading
+
+from ansible.module_utils.six import reraise
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def parallel_map(func, items, workers, setup=None, teardown=None):
+    """
+    Apply func(state, item) to each item with a pool of worker threads and return the results in the items order.
+    Each worker calls setup() to build its own state (e.g. its database connections) and teardown(state) when it ends.
+    After the first failure the workers stop picking items and the exception is raised again once all of them ended.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    pending = queue.Queue()
+    for i, item in enumerate(items):
+        pending.put((i, item))
+
+    def worker():
+        state = None
+        try:
+            state = setup() if setup else None
+            while not errors:
+                try:
+                    i, item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                results[i] = func(state, item)
+        except Exception:
+            errors.append(sys.exc_info())
+        finally:
+            if teardown and state is not None:
+                teardown(state)
+
+    threads = [threading.Thread(target=worker) for n in range(max(1, min(workers, len(items))))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        reraise(*errors[0])
+    return results
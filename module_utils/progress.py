@@ -0,0 +1,84 @@
+import threading
+
+import psycopg2
+
+# Progress reporting views with the columns holding the work done and the total work of the current phase.
+# The phases count different units: the first pair of columns with a total is used.
+_PROGRESS_VIEWS = [
+    (90600, "pg_stat_progress_vacuum", "'VACUUM'", [("heap_blks_scanned", "heap_blks_total")]),
+    (120000, "pg_stat_progress_create_index", "command", [
+        ("blocks_done", "blocks_total"),
+        ("tuples_done", "tuples_total"),
+        ("lockers_done", "lockers_total"),
+        ("partitions_done", "partitions_total")
+    ]),
+    (120000, "pg_stat_progress_cluster", "command", [("heap_blks_scanned", "heap_blks_total")]),
+    (130000, "pg_stat_progress_analyze", "'ANALYZE'", [
+        ("sample_blks_scanned", "sample_blks_total"),
+        ("ext_stats_computed", "ext_stats_total"),
+        ("child_tables_done", "child_tables_total")
+    ]),
+]
+
+
+def _first_counted(columns, index):
+    return "CASE %s END" % " ".join("WHEN %s > 0 THEN %s" % (c[1], c[index]) for c in columns)
+
+
+def backend_progress(cursor, pids=None):
+    """
+    Progress of the commands running on the backends of the current database, indexed by backend pid.
+    Only the backends in pids are returned, when given.
+    """
+    queries = [
+        """
+        SELECT pid, %s AS command, relid::regclass::text AS relation, phase, %s AS done, %s AS total
+        FROM pg_catalog.%s WHERE datname = current_database()
+        """ % (command, _first_counted(columns, 0), _first_counted(columns, 1), view)
+        for version, view, command, columns in _PROGRESS_VIEWS
+        if cursor.connection.server_version >= version
+    ]
+    if len(queries) == 0:
+        return {}
+
+    cursor.execute(" UNION ALL ".join(queries))
+    progress = {}
+    for r in cursor.fetchall():
+        if pids is not None and r['pid'] not in pids:
+            continue
+        r['percent'] = round(r['done'] * 100.0 / r['total'], 1) if r['total'] else None
+        progress[r['pid']] = dict(r)
+    return progress
+
+
+class ProgressMonitor(object):
+    """
+    Thread sampling every interval seconds, from its own connection, the progress of the commands running on the
+    other backends. The last sample of each backend is kept until it is taken with pop().
+    """
+
+    def __init__(self, cursor, interval=1):
+        self.cursor = cursor
+        self.interval = interval
+        self.samples = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.samples.update(backend_progress(self.cursor))
+            except psycopg2.Error:
+                return
+            self._stopped.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def pop(self, pid):
+        return self.samples.pop(pid, None)
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,29 @@
+import psycopg2
+import random
+import time
+
+# serialization_failure, deadlock_detected and lock_not_available (raised when lock_timeout expires)
+RETRYABLE_SQLSTATES = ["40001", "40P01", "55P03"]
+
+_MAX_BACKOFF = 10.0
+
+
+def run_with_retry(cursor, transaction, max_attempts=3, backoff=0.1, retryable_sqlstates=None):
+    """
+    Run transaction(cursor) and replay it when it fails with one of retryable_sqlstates, up to max_attempts times.
+    Before each replay the transaction is rolled back and an exponential backoff with full jitter is slept.
+    Returns a tuple with the result of transaction and the number of attempts.
+    """
+    if retryable_sqlstates is None:
+        retryable_sqlstates = RETRYABLE_SQLSTATES
+
+    attempt = 1
+    while True:
+        try:
+            return transaction(cursor), attempt
+        except psycopg2.DatabaseError as e:
+            if e.pgcode not in retryable_sqlstates or attempt >= max_attempts:
+                raise
+            cursor.connection.rollback()
+            time.sleep(random.uniform(0, min(_MAX_BACKOFF, backoff * 2 ** (attempt - 1))))
+            attempt += 1
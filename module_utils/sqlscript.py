@@ -0,0 +1,164 @@
+import re
+
+_DOLLAR_TAG = re.compile(r'\$(?:[^\W\d]\w*)?\$', re.UNICODE)
+_WORD_CHAR = re.compile(r'\w', re.UNICODE)
+_COPY_FROM_STDIN = re.compile(r'^COPY\b.*\bFROM\s+STDIN\b', re.IGNORECASE | re.DOTALL)
+
+
+def _is_word_char(c):
+    return _WORD_CHAR.match(c) is not None
+
+
+class CopyData(object):
+    """File-like object returning the data lines of a COPY FROM STDIN block, up to the \\. line or to the end"""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+        self.ended = False
+        self.size = 0
+        self.line_count = 0
+
+    def read(self, size=-1):
+        while not self.ended and (size < 0 or len(self._buffer) < size):
+            try:
+                line = next(self._lines)
+            except StopIteration:
+                self.ended = True
+                break
+            self.size += len(line)
+            self.line_count += 1
+            if line.rstrip('\r\n') == '\\.':
+                self.ended = True
+                break
+            self._buffer += line
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+    def drain(self):
+        while not self.ended:
+            self.read(65536)
+        self._buffer = ''
+
+
+def split_script(lines):
+    """
+    Split a SQL script, given as an iterable of lines, in statements without loading it all in memory.
+    Semicolons in quoted strings and identifiers, dollar quoted strings and comments do not end a statement.
+    Yields a dict for each statement with its text (without the final semicolon), the offset (in characters) and the
+    line where it starts and copy_data: for COPY ... FROM STDIN statements a CopyData object streaming the data lines
+    that follow the statement, None for the others. The data must be read before asking for the next statement.
+    Raises ValueError for unterminated quotes or comments and for psql meta-commands.
+    """
+    lines = iter(lines)
+    state = None
+    comment_depth = 0
+    backslash_escapes = False
+    buf = []
+    start = None
+    offset = 0
+    line_no = 0
+    state_line = 0
+
+    def statement(text):
+        text = text.strip()
+        copy_data = CopyData(lines) if _COPY_FROM_STDIN.match(text) else None
+        return {'statement': text, 'offset': start[0], 'line': start[1], 'copy_data': copy_data}
+
+    for line in lines:
+        line_no += 1
+        if state is None and start is None and line.startswith('\\'):
+            raise ValueError("psql meta-commands are not supported (line %d)" % line_no)
+
+        copy_data = None
+        segment_start = 0
+        i = 0
+        n = len(line)
+        while i < n:
+            c = line[i]
+            if state is None:
+                if c == '-' and line[i + 1:i + 2] == '-':
+                    break
+                elif c == '/' and line[i + 1:i + 2] == '*':
+                    state, comment_depth, state_line = '/*', 1, line_no
+                    i += 2
+                    continue
+                elif c == ';':
+                    buf.append(line[segment_start:i])
+                    segment_start = i + 1
+                    if start is not None:
+                        s = statement(''.join(buf))
+                        yield s
+                        if s['copy_data'] is not None:
+                            copy_data = s['copy_data']
+                            copy_data.drain()
+                    buf = []
+                    start = None
+                elif not c.isspace():
+                    if start is None:
+                        # Comments and blanks before the statement are not part of it
+                        start = (offset + i, line_no)
+                        buf = []
+                        segment_start = i
+                    if c == "'":
+                        # E'...' strings accept backslash escapes
+                        backslash_escapes = i > 0 and line[i - 1] in 'eE' and (i < 2 or not _is_word_char(line[i - 2]))
+                        state, state_line = "'", line_no
+                    elif c == '"':
+                        state, state_line = '"', line_no
+                    elif c == '$' and (i == 0 or not _is_word_char(line[i - 1])):
+                        m = _DOLLAR_TAG.match(line, i)
+                        if m:
+                            state, state_line = m.group(0), line_no
+                            i = m.end()
+                            continue
+            elif state == "'":
+                if c == '\\' and backslash_escapes:
+                    i += 2
+                    continue
+                if c == "'":
+                    if line[i + 1:i + 2] == "'":
+                        i += 2
+                        continue
+                    state = None
+            elif state == '"':
+                if c == '"':
+                    state = None
+            elif state == '/*':
+                if c == '*' and line[i + 1:i + 2] == '/':
+                    comment_depth -= 1
+                    if comment_depth == 0:
+                        state = None
+                    i += 2
+                    continue
+                if c == '/' and line[i + 1:i + 2] == '*':
+                    comment_depth += 1
+                    i += 2
+                    continue
+            elif line.startswith(state, i):
+                # End of the dollar quoted string
+                i += len(state)
+                state = None
+                continue
+            i += 1
+
+        buf.append(line[segment_start:])
+        offset += n
+        if copy_data is not None:
+            # The data lines were consumed from the same iterator
+            offset += copy_data.size
+            line_no += copy_data.line_count
+
+    if state is not None:
+        raise ValueError("unterminated %s starting at line %d" % ("comment" if state == '/*' else "quote", state_line))
+    if start is not None:
+        s = statement(''.join(buf))
+        yield s
+        if s['copy_data'] is not None:
+            s['copy_data'].drain()
@@ -0,0 +1,54 @@
+import collections
+import threading
+
+
+class BoundedPipe(object):
+    """
+    In-memory pipe connecting a COPY ... TO STDOUT (the writer) with a COPY ... FROM STDIN (the reader) running in
+    different threads. write() blocks while max_size bytes are buffered and read() blocks while the buffer is empty.
+    The writer calls close() when it has finished, either side calls abort() to unblock the other one on errors.
+    """
+
+    def __init__(self, max_size=8 * 1024 * 1024):
+        self.max_size = max_size
+        self._chunks = collections.deque()
+        self._size = 0
+        self._closed = False
+        self._aborted = False
+        self._condition = threading.Condition()
+
+    def write(self, data):
+        with self._condition:
+            while self._size >= self.max_size and not self._aborted:
+                self._condition.wait()
+            if self._aborted:
+                raise IOError("pipe aborted")
+            self._chunks.append(data)
+            self._size += len(data)
+            self._condition.notify_all()
+
+    def read(self, size=-1):
+        with self._condition:
+            while not self._chunks and not self._closed and not self._aborted:
+                self._condition.wait()
+            if self._aborted:
+                raise IOError("pipe aborted")
+            if not self._chunks:
+                return b''
+            data = self._chunks.popleft()
+            if 0 < size < len(data):
+                self._chunks.appendleft(data[size:])
+                data = data[:size]
+            self._size -= len(data)
+            self._condition.notify_all()
+            return data
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self):
+        with self._condition:
+            self._aborted = True
+            self._condition.notify_all()
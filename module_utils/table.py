@@ -1,3 +1,8 @@
+import hashlib
+
+from psycopg2 import sql
+
+
 def _table_exists_query():
     return """
         SELECT c.oid, n.nspname as "Schema",
@@ -79,16 +84,209 @@ def _get_primary_key(cursor, table_oid):
     return cursor.fetchone()['pg_get_constraintdef']
 
 
+def _table_oid(cursor, schema, name):
+    cursor.execute(
+        """
+        SELECT c.oid
+        FROM pg_catalog.pg_class c
+             JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND c.relkind = 'r';
+        """,
+        (schema, name)
+    )
+    if cursor.rowcount != 1:
+        return None
+    return cursor.fetchone()['oid']
+
+
+def primary_key_columns(cursor, schema, name):
+    """Names of the columns of the primary key of the table in key order, empty if the table has no primary key"""
+    table_oid = _table_oid(cursor, schema, name)
+    if table_oid is None or _get_primary_key(cursor, table_oid) is False:
+        return []
+    cursor.execute(
+        """
+        SELECT a.attname
+        FROM (
+          SELECT i.indrelid, i.indkey, generate_subscripts(i.indkey, 1) AS n
+          FROM pg_catalog.pg_index i
+          WHERE i.indrelid = %s AND i.indisprimary
+        ) k
+          JOIN pg_catalog.pg_attribute a ON a.attrelid = k.indrelid AND a.attnum = k.indkey[k.n]
+        ORDER BY k.n;
+        """,
+        (table_oid,)
+    )
+    return [r['attname'] for r in cursor.fetchall()]
+
+
+def table_columns(cursor, schema, name):
+    """Columns of the table as a list of dicts with name, type and null keys, like the columns given in playbooks"""
+    table_oid = _table_oid(cursor, schema, name)
+    if table_oid is None:
+        return []
+    return [
+        {'name': r['attname'], 'type': r['format_type'], 'null': not r['attnotnull']}
+        for r in _table_columns_definition(cursor, table_oid)
+    ]
+
+
+def primary_key_range_condition(key_columns, lower, upper):
+    """
+    SQL condition selecting the rows with primary key greater than lower and lower or equal than upper,
+    with its parameters. A None bound means unbounded.
+    """
+    key = sql.SQL("({})").format(sql.SQL(", ").join([sql.Identifier(c) for c in key_columns]))
+    values = sql.SQL("({})").format(sql.SQL(", ").join([sql.Placeholder()] * len(key_columns)))
+    conditions = [sql.SQL("TRUE")]
+    parameters = []
+    if lower is not None:
+        conditions.append(sql.SQL("{key} > {values}").format(key=key, values=values))
+        parameters.extend(lower)
+    if upper is not None:
+        conditions.append(sql.SQL("{key} <= {values}").format(key=key, values=values))
+        parameters.extend(upper)
+    return sql.SQL(" AND ").join(conditions), parameters
+
+
+def primary_key_ranges(cursor, schema, name, key_columns, chunk_size):
+    """
+    Split the table in ranges of chunk_size rows walking the primary key index, one round trip for each range.
+    Returns a list of (lower, upper) tuples for primary_key_range_condition(): the first and the last ranges are
+    unbounded so rows added after the split are covered too.
+    """
+    key = sql.SQL(", ").join([sql.Identifier(c) for c in key_columns])
+    ranges = []
+    lower = None
+    while True:
+        condition, parameters = primary_key_range_condition(key_columns, lower, None)
+        cursor.execute(
+            sql.SQL("SELECT {key} FROM {schema}.{name} WHERE {condition} ORDER BY {key} OFFSET %s LIMIT 1").format(
+                key=key,
+                schema=sql.Identifier(schema),
+                name=sql.Identifier(name),
+                condition=condition
+            ),
+            parameters + [chunk_size - 1]
+        )
+        row = cursor.fetchone()
+        if row is None:
+            break
+        upper = [row[c] for c in key_columns]
+        ranges.append((lower, upper))
+        lower = upper
+    ranges.append((lower, None))
+    return ranges
+
+
 def _build_primary_key_def(columns):
     return 'PRIMARY KEY (' + ', '.join(columns) + ')'
 
 
+def _table_fingerprint_query():
+    return """
+        SELECT md5(
+          coalesce((
+            SELECT string_agg(
+              a.attname || ':' || pg_catalog.format_type(a.atttypid, a.atttypmod) || ':' ||
+                CASE WHEN a.attnotnull THEN 'f' ELSE 't' END,
+              ',' ORDER BY a.attname::text COLLATE "C"
+            )
+            FROM pg_catalog.pg_attribute a
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+          ), '') || '|' ||
+          coalesce((
+            SELECT pg_catalog.pg_get_constraintdef(con.oid, true)
+            FROM pg_catalog.pg_constraint con
+            WHERE con.conrelid = c.oid AND con.contype = 'p'
+          ), '') || '|' ||
+          CASE WHEN %s <> '' THEN pg_catalog.pg_get_userbyid(c.relowner) ELSE '' END
+        ) AS fingerprint
+        FROM pg_catalog.pg_class c
+             JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND c.relkind = 'r';
+        """
+
+
+def table_fingerprint(cursor, schema, name, owner):
+    """
+    Fingerprint of the current definition of the table (columns, primary key and owner if given) computed server side
+    in a single query. Returns None if the table does not exist.
+    """
+    cursor.execute(_table_fingerprint_query(), (owner, schema, name))
+    if cursor.rowcount != 1:
+        return None
+    return cursor.fetchone()['fingerprint']
+
+
+def build_table_fingerprint(columns, primary_key, owner):
+    """Fingerprint of the table definition given in the playbook, comparable with table_fingerprint()"""
+    definition = ",".join([
+        "%s:%s:%s" % (c['name'], _normalize_column_types(c['type']), 'f' if c.get('null') is False else 't')
+        for c in sorted(columns, key=lambda c: c['name'].encode('utf-8'))
+    ])
+    definition += "|" + (_build_primary_key_def(primary_key) if len(primary_key) > 0 else "")
+    definition += "|" + owner
+    return hashlib.md5(definition.encode('utf-8')).hexdigest()
+
+
+def lock_table_convergence(cursor, schema, name):
+    """
+    Serialize the sessions converging the same table with a transaction level advisory lock keyed on schema and name
+    """
+    cursor.execute("SELECT pg_catalog.pg_advisory_xact_lock(hashtext(%s), hashtext(%s))", (schema, name))
+
+
 def table_exists(cursor, schema, name):
     cursor.execute(_table_exists_query(), (schema, name))
     return cursor.rowcount == 1
 
 
-def table_matches(cursor, schema, name, owner, columns, primary_key, diff):
+def table_definitions(cursor, tables):
+    """
+    Definitions of the given (schema, name) tables read from the catalog in a single query, indexed by (schema, name).
+    Each definition is a dict with owner, columns and primary_key, as expected by compare_table_definition().
+    Missing tables are not returned.
+    """
+    cursor.execute(
+        """
+        SELECT n.nspname AS schema, c.relname AS name, pg_catalog.pg_get_userbyid(c.relowner) AS owner,
+          (
+            SELECT json_agg(json_build_object(
+              'attname', a.attname,
+              'format_type', pg_catalog.format_type(a.atttypid, a.atttypmod),
+              'attnotnull', a.attnotnull
+            ) ORDER BY a.attnum)
+            FROM pg_catalog.pg_attribute a
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+          ) AS columns,
+          (
+            SELECT pg_catalog.pg_get_constraintdef(con.oid, true)
+            FROM pg_catalog.pg_constraint con
+            WHERE con.conrelid = c.oid AND con.contype = 'p'
+          ) AS primary_key
+        FROM pg_catalog.pg_class c
+             JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+             JOIN unnest(%s::text[], %s::text[]) AS t(schema, name) ON t.schema = n.nspname AND t.name = c.relname
+        WHERE c.relkind = 'r';
+        """,
+        ([t[0] for t in tables], [t[1] for t in tables])
+    )
+    definitions = {}
+    for r in cursor.fetchall():
+        definitions[(r['schema'], r['name'])] = {
+            'owner': r['owner'],
+            'columns': r['columns'] or [],
+            'primary_key': r['primary_key'] if r['primary_key'] is not None else False
+        }
+    return definitions
+
+
+def compare_table_definition(definition, owner, columns, primary_key, diff):
+    """
+    Compare the definition of a table read from the catalog (None if the table does not exist) with the owner, columns
+    and primary key given in the playbook. The differences are stored in diff, returns True if the table matches.
+    """
     diff['exists'] = None
     diff['owner'] = None
     diff['playbook_columns'] = {}
@@ -98,19 +296,15 @@ def table_matches(cursor, schema, name, owner, columns, primary_key, diff):
     for c in columns:
         diff['playbook_columns'][c['name']] = None
 
-    if not table_exists(cursor, schema, name):
+    if definition is None:
         diff['exists'] = False
         return False
     diff['exists'] = True
 
-    cursor.execute(_table_exists_query(), (schema, name))
-    r = cursor.fetchone()
-    table_oid = r['oid']
-
-    diff['owner'] = r['Owner'] != owner and len(owner) > 0
+    diff['owner'] = definition['owner'] != owner and len(owner) > 0
 
     result = True
-    for r in _table_columns_definition(cursor, table_oid):
+    for r in definition['columns']:
         diff['existing_columns'][r['attname']] = None
         col_diff = {}
         col_comparison = _compare_column(r, columns, col_diff)
@@ -124,7 +318,11 @@ def table_matches(cursor, schema, name, owner, columns, primary_key, diff):
             diff['playbook_columns'][r['attname']] = True
         result = result and col_comparison
 
-    current_primary_key = _get_primary_key(cursor, table_oid)
+    # Columns declared in the playbook and missing from the table
+    if None in diff['playbook_columns'].values():
+        result = False
+
+    current_primary_key = definition['primary_key']
     if current_primary_key is False and len(primary_key) > 0:
         diff['primary_key'] = False
         result = False
@@ -139,3 +337,15 @@ def table_matches(cursor, schema, name, owner, columns, primary_key, diff):
 
     return result
 
+
+def table_matches(cursor, schema, name, owner, columns, primary_key, diff):
+    definition = None
+    cursor.execute(_table_exists_query(), (schema, name))
+    if cursor.rowcount == 1:
+        r = cursor.fetchone()
+        definition = {
+            'owner': r['Owner'],
+            'columns': _table_columns_definition(cursor, r['oid']),
+            'primary_key': _get_primary_key(cursor, r['oid'])
+        }
+    return compare_table_definition(definition, owner, columns, primary_key, diff)
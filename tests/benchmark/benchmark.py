@@ -0,0 +1,251 @@
+"""
+Benchmark of the role modules against a throwaway local PostgreSQL cluster.
+
+The cluster is created with initdb in a temporary directory and started with pg_ctl, listening only on a unix
+socket. Each scenario runs a module through tests/benchmark/runner.py in a dedicated process and records wall time,
+peak RSS, round trips to the server and size of the module results.
+
+Usage:
+    python tests/benchmark/benchmark.py [--scale 0.1] [--scenario NAME ...] [--output results.json]
+    python tests/benchmark/benchmark.py --update-baseline
+
+Results are compared with tests/benchmark/baseline.json: a metric regresses when it exceeds the baseline value by
+more than the metric threshold and the script exits with status 1.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+
+import psycopg2
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+DEFAULT_THRESHOLDS = {
+    "wall_time": 0.25,
+    "peak_rss_kb": 0.20,
+    "round_trips": 0.0,
+    "payload_bytes": 0.05,
+}
+
+
+class Cluster(object):
+    """PostgreSQL cluster living in a temporary directory"""
+
+    def __init__(self, pg_bin):
+        self.pg_bin = pg_bin
+        self.base_dir = tempfile.mkdtemp(prefix="pgsql_bench_")
+        self.data_dir = os.path.join(self.base_dir, "data")
+        self.socket_dir = os.path.join(self.base_dir, "sock")
+        self.port = _free_port()
+
+    def _bin(self, name):
+        return os.path.join(self.pg_bin, name) if self.pg_bin else name
+
+    def start(self):
+        os.mkdir(self.socket_dir)
+        subprocess.check_call(
+            [self._bin("initdb"), "-D", self.data_dir, "-A", "trust", "-U", "postgres", "-E", "UTF8"],
+            stdout=subprocess.DEVNULL
+        )
+        subprocess.check_call([
+            self._bin("pg_ctl"), "-D", self.data_dir, "-w", "-l", os.path.join(self.base_dir, "postgresql.log"),
+            "-o", "-p %d -k %s -c listen_addresses='' -c fsync=off" % (self.port, self.socket_dir),
+            "start"
+        ], stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        subprocess.call(
+            [self._bin("pg_ctl"), "-D", self.data_dir, "-m", "immediate", "stop"],
+            stdout=subprocess.DEVNULL
+        )
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def module_args(self, **kwargs):
+        args = dict(login_unix_socket=self.socket_dir, port=str(self.port), login_user="postgres")
+        args.update(kwargs)
+        return args
+
+    def execute(self, statement):
+        connection = psycopg2.connect(host=self.socket_dir, port=self.port, user="postgres", database="postgres")
+        connection.autocommit = True
+        connection.cursor().execute(statement)
+        connection.close()
+
+
+def _free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def _find_pg_bin():
+    for d in sorted(glob.glob("/usr/lib/postgresql/*/bin"), reverse=True) + ["/usr/pgsql/bin"]:
+        if os.path.exists(os.path.join(d, "initdb")):
+            return d
+    return ""
+
+
+def _table_columns(count):
+    return [{"name": "id", "type": "bigint", "null": False}] + [
+        {"name": "col_%d" % i, "type": "text"} for i in range(1, count)
+    ]
+
+
+def scenario_row(cluster, scale):
+    cluster.execute("CREATE TABLE bench_row (key text PRIMARY KEY, value text NOT NULL)")
+    return "postgresql_row", [
+        cluster.module_args(table="bench_row", row={"key": "key_%d" % i, "value": "value_%d" % i})
+        for i in range(int(10000 * scale))
+    ]
+
+
+def scenario_table(cluster, scale):
+    return "postgresql_table", [
+        cluster.module_args(name="bench_table_%d" % i, columns=_table_columns(500), primary_key=["id"])
+        for i in range(int(300 * scale))
+    ]
+
+
+def scenario_table_converged(cluster, scale):
+    # Same tables of scenario_table, already created with the declared definition
+    module, args_list = scenario_table(cluster, scale)
+    for args in args_list:
+        cluster.execute("CREATE TABLE %s (%s, PRIMARY KEY (id))" % (args["name"], ", ".join(
+            "%s %s%s" % (c["name"], c["type"], " NOT NULL" if c.get("null") is False else "") for c in args["columns"]
+        )))
+    return module, args_list
+
+
+def scenario_query(cluster, scale):
+    return "postgresql_query", [
+        cluster.module_args(
+            query="SELECT g AS id, md5(g::text) AS value FROM generate_series(1, %(rows)s) g",
+            parameters={"rows": int(1000000 * scale)}
+        )
+    ]
+
+
+def scenario_command(cluster, scale):
+    cluster.execute(
+        "CREATE TABLE bench_command AS SELECT g AS id, md5(g::text) AS value FROM generate_series(1, %d) g" %
+        int(1000000 * scale)
+    )
+    return "postgresql_command", [
+        cluster.module_args(command="UPDATE bench_command SET value = upper(value)"),
+        cluster.module_args(command="UPDATE bench_command SET value = lower(value) WHERE mod(id, 2) = 0"),
+    ]
+
+
+SCENARIOS = [
+    ("postgresql_row_10k_rows", scenario_row),
+    ("postgresql_table_300x500_columns", scenario_table),
+    ("postgresql_table_300x500_columns_converged", scenario_table_converged),
+    ("postgresql_query_1m_rows", scenario_query),
+    ("postgresql_command_bulk_update", scenario_command),
+]
+
+
+def run_scenario(cluster, scenario, scale):
+    module, args_list = scenario(cluster, scale)
+    work_dir = tempfile.mkdtemp(prefix="pgsql_bench_run_")
+    try:
+        args_file = os.path.join(work_dir, "args.json")
+        metrics_file = os.path.join(work_dir, "metrics.json")
+        with open(args_file, "w") as f:
+            json.dump(args_list, f)
+        subprocess.check_call(
+            [sys.executable, os.path.join(BENCHMARK_DIR, "runner.py"), module, args_file, metrics_file]
+        )
+        with open(metrics_file) as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(results, baseline):
+    """Return the list of metrics exceeding the baseline by more than their threshold"""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    thresholds.update(baseline.get("thresholds", {}))
+    regressions = []
+    for name, metrics in results.items():
+        expected = baseline.get("scenarios", {}).get(name)
+        if expected is None:
+            continue
+        for metric, threshold in thresholds.items():
+            if metric in expected and metrics[metric] > expected[metric] * (1 + threshold):
+                regressions.append({
+                    "scenario": name,
+                    "metric": metric,
+                    "baseline": expected[metric],
+                    "value": metrics[metric],
+                    "threshold": threshold
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the role modules on a throwaway PostgreSQL cluster")
+    parser.add_argument("--pg-bin", default=_find_pg_bin(), help="directory with initdb and pg_ctl")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale factor applied to the scenario sizes")
+    parser.add_argument("--scenario", action="append", help="run only the given scenarios")
+    parser.add_argument("--output", help="write the results as JSON in this file")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    options = parser.parse_args()
+
+    results = {}
+    for name, scenario in SCENARIOS:
+        if options.scenario and name not in options.scenario:
+            continue
+        cluster = Cluster(options.pg_bin)
+        try:
+            cluster.start()
+            results[name] = run_scenario(cluster, scenario, options.scale)
+        finally:
+            cluster.stop()
+        print("%-45s %s" % (name, json.dumps(results[name], sort_keys=True)))
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    failed = [name for name, metrics in results.items() if metrics["failures"] > 0]
+    if failed:
+        print("module failures in scenarios: %s" % ", ".join(failed))
+        return 1
+
+    if options.update_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(
+                {"scale": options.scale, "thresholds": DEFAULT_THRESHOLDS, "scenarios": results},
+                f, indent=2, sort_keys=True
+            )
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print("no baseline found in %s, run with --update-baseline to record one" % options.baseline)
+        return 0
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != options.scale:
+        print("baseline recorded with scale %s, results not compared" % baseline.get("scale"))
+        return 0
+
+    regressions = compare(results, baseline)
+    for r in regressions:
+        print("REGRESSION %(scenario)s %(metric)s: %(value)s > %(baseline)s (+%(threshold)s)" % r)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
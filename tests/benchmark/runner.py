@@ -0,0 +1,124 @@
+"""
+Run a module of the role in process, once for each set of arguments in a JSON file, and write its metrics.
+
+Usage: runner.py MODULE ARGS_FILE METRICS_FILE
+
+The role module_utils are made importable as ansible.module_utils.* as Ansible does when it ships the module.
+"""
+import importlib.util
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+import ansible.module_utils
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from ansible.module_utils import basic
+
+ROLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+round_trips = [0]
+
+
+class CountingCursor(psycopg2.extras.RealDictCursor):
+    def execute(self, query, vars=None):
+        round_trips[0] += 1
+        return super(CountingCursor, self).execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        round_trips[0] += len(vars_list)
+        return super(CountingCursor, self).executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        round_trips[0] += 1
+        return super(CountingCursor, self).copy_expert(sql, file, size)
+
+
+def _counting_connection_factory(base):
+    class CountingConnection(base):
+        def commit(self):
+            round_trips[0] += 1
+            return super(CountingConnection, self).commit()
+
+        def rollback(self):
+            round_trips[0] += 1
+            return super(CountingConnection, self).rollback()
+
+    return CountingConnection
+
+
+def _install_counters():
+    original_connect = psycopg2.connect
+
+    def connect(*args, **kwargs):
+        round_trips[0] += 1
+        kwargs['connection_factory'] = _counting_connection_factory(
+            kwargs.get('connection_factory') or psycopg2.extensions.connection
+        )
+        return original_connect(*args, **kwargs)
+
+    psycopg2.connect = connect
+    psycopg2.extras.RealDictCursor = CountingCursor
+
+
+def _load_module(name):
+    ansible.module_utils.__path__.insert(0, os.path.join(ROLE_DIR, "module_utils"))
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROLE_DIR, "library", name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run_once(module, args):
+    args = dict(args)
+    args.update(_ansible_remote_tmp="/tmp", _ansible_keep_remote_files=False)
+    basic._ANSIBLE_ARGS = json.dumps({"ANSIBLE_MODULE_ARGS": args}).encode("utf-8")
+
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        module.run_module()
+    except SystemExit:
+        pass
+    finally:
+        output, sys.stdout = sys.stdout.getvalue(), stdout
+    return output
+
+
+def main(module_name, args_file, metrics_file):
+    with open(args_file) as f:
+        args_list = json.load(f)
+
+    _install_counters()
+    module = _load_module(module_name)
+
+    payload_bytes = 0
+    failures = []
+    start = time.time()
+    for args in args_list:
+        output = _run_once(module, args)
+        payload_bytes += len(output.encode("utf-8"))
+        result = json.loads(output)
+        if result.get("failed"):
+            failures.append(result.get("msg"))
+    wall_time = time.time() - start
+
+    with open(metrics_file, "w") as f:
+        json.dump({
+            "invocations": len(args_list),
+            "failures": len(failures),
+            "first_failure": failures[0] if failures else None,
+            "wall_time": wall_time,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "round_trips": round_trips[0],
+            "payload_bytes": payload_bytes,
+        }, f)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
@@ -0,0 +1,105 @@
+"""
+Tests of the postgresql_script module.
+
+The script splitter is tested everywhere. The module tests need psycopg2, Ansible and the PostgreSQL server binaries:
+they run the module through tests/benchmark/runner.py on a throwaway cluster, like the benchmark does.
+"""
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+ROLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCHMARK_DIR = os.path.join(ROLE_DIR, "tests", "benchmark")
+
+COPY_SCRIPT = u"""-- load the items; with a comment
+CREATE TABLE script_items (id integer PRIMARY KEY, label text);
+COPY script_items (id, label) FROM STDIN;
+1\tfirst;item
+2\t$$second$$
+\\.
+UPDATE script_items SET label = upper(label) WHERE id = 1;
+"""
+
+
+def _load_sqlscript():
+    spec = importlib.util.spec_from_file_location("sqlscript", os.path.join(ROLE_DIR, "module_utils", "sqlscript.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_split_script_streams_copy_data():
+    sqlscript = _load_sqlscript()
+    statements = []
+    for s in sqlscript.split_script(io.StringIO(COPY_SCRIPT)):
+        data = s['copy_data'].read() if s['copy_data'] is not None else None
+        statements.append((s['line'], s['statement'], data))
+
+    assert statements == [
+        (2, "CREATE TABLE script_items (id integer PRIMARY KEY, label text)", None),
+        (3, "COPY script_items (id, label) FROM STDIN", "1\tfirst;item\n2\t$$second$$\n"),
+        (7, "UPDATE script_items SET label = upper(label) WHERE id = 1", None),
+    ]
+
+
+@pytest.fixture(scope="module")
+def cluster():
+    pytest.importorskip("psycopg2")
+    pytest.importorskip("ansible")
+    sys.path.insert(0, BENCHMARK_DIR)
+    import benchmark
+
+    pg_bin = benchmark._find_pg_bin()
+    if shutil.which(os.path.join(pg_bin, "initdb") if pg_bin else "initdb") is None:
+        pytest.skip("PostgreSQL server binaries not found")
+    c = benchmark.Cluster(pg_bin)
+    c.start()
+    yield c
+    c.stop()
+
+
+def _run_script(cluster, tmp_path, script, **kwargs):
+    import runner
+
+    path = tmp_path / "script.sql"
+    path.write_text(script)
+    module = runner._load_module("postgresql_script")
+    return json.loads(runner._run_once(module, cluster.module_args(script=str(path), **kwargs)))
+
+
+def _labels(cluster):
+    import psycopg2
+
+    connection = psycopg2.connect(host=cluster.socket_dir, port=cluster.port, user="postgres", database="postgres")
+    cursor = connection.cursor()
+    cursor.execute("SELECT id, label FROM script_items ORDER BY id")
+    rows = cursor.fetchall()
+    connection.close()
+    return rows
+
+
+@pytest.mark.parametrize("mode,deadline", [("transaction", 0), ("savepoint", 0), ("autocommit", 60)])
+def test_script_with_copy_block(cluster, tmp_path, mode, deadline):
+    cluster.execute("DROP TABLE IF EXISTS script_items")
+
+    result = _run_script(cluster, tmp_path, COPY_SCRIPT, mode=mode, deadline=deadline)
+
+    assert not result.get("failed"), result.get("msg")
+    assert [s['rowcount'] for s in result['statements']] == [-1, 2, 1]
+    assert _labels(cluster) == [(1, "FIRST;ITEM"), (2, "$$second$$")]
+
+
+def test_script_failure_after_copy_block(cluster, tmp_path):
+    cluster.execute("DROP TABLE IF EXISTS script_items")
+
+    result = _run_script(cluster, tmp_path, COPY_SCRIPT + u"SELECT 1 / 0;\n", mode="savepoint")
+
+    assert result["failed"]
+    assert result["failed_statement"]["line"] == 8
+    assert result["committed"]
+    assert len(_labels(cluster)) == 2